@@ -0,0 +1,83 @@
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+import expressions
+import parser
+import resolver
+import scanner
+import statements
+import tokens
+
+MAGIC = b'LOXAST1\n'
+CACHE_DIR = '__loxcache__'
+
+# Anything that changes how a script is scanned, parsed or resolved, or how the result is laid out, must invalidate
+# existing cache files. Hashing the modules that define it does that without a version number to remember to bump.
+FRONT_END_MODULES = [tokens, scanner, expressions, statements, parser, resolver]
+
+_interpreterVersion = None
+
+
+def interpreterVersion():
+    global _interpreterVersion
+    if _interpreterVersion is None:
+        digest = hashlib.sha256(sys.implementation.cache_tag.encode())
+        for module in FRONT_END_MODULES:
+            with open(module.__file__, 'rb') as moduleFile:
+                digest.update(moduleFile.read())
+        _interpreterVersion = digest.digest()
+    return _interpreterVersion
+
+
+class AstCache:
+    # Keeps the resolved statements of a script next to it, like `__pycache__`, so later runs skip the front end. The
+    # file starts with a magic number, the interpreter version and a hash of the source; a mismatch on any of them
+    # makes it a miss.
+    hits = 0
+    misses = 0
+
+    def __init__(self, path, source):
+        directory, name = os.path.split(os.path.abspath(path))
+        self.directory = os.path.join(directory, CACHE_DIR)
+        self.path = os.path.join(self.directory, f'{name}.ast')
+        self.header = MAGIC + interpreterVersion() + hashlib.sha256(source).digest()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as cacheFile:
+                if cacheFile.read(len(self.header)) == self.header:
+                    # Unpickling creates a lot of objects and no garbage; don't let the collector scan them all.
+                    gc.disable()
+                    try:
+                        program = pickle.load(cacheFile)
+                    finally:
+                        gc.enable()
+                    AstCache.hits += 1
+                    return program
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+        AstCache.misses += 1
+        return None
+
+    def store(self, program):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, delete=False) as cacheFile:
+                try:
+                    cacheFile.write(self.header)
+                    pickle.dump(program, cacheFile, pickle.HIGHEST_PROTOCOL)
+                except BaseException:
+                    cacheFile.close()
+                    os.remove(cacheFile.name)
+                    raise
+            os.replace(cacheFile.name, self.path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            pass  # The cache is only an optimization; a script that can't be cached still runs.
+
+    @staticmethod
+    def stats():
+        return {'hits': AstCache.hits, 'misses': AstCache.misses}
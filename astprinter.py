@@ -1,5 +1,8 @@
-from expressions import Expr, Binary, Grouping, Literal, Unary
+from expressions import Expr, Binary, Grouping, Literal, Unary, Assign, Call, Get, Logical, Set, Super, This, Variable
 from exprvisitor import ExprVisitor
+from scanner import KEYWORDS, OPERATORS
+
+LEXEMES = {tokenType: lexeme for lexeme, tokenType in {**KEYWORDS, **OPERATORS}.items()}
 
 
 class AstPrinter(ExprVisitor):
@@ -10,8 +13,17 @@ class AstPrinter(ExprVisitor):
         inner = ''.join(f' {expr.accept(self)}' for expr in exprs)
         return f'({name}{inner})'
 
+    def visitAssignExpr(self, expr: Assign):
+        return self.parenthesize(f'= {expr.name.lexeme}', expr.value)
+
     def visitBinaryExpr(self, expr: Binary):
-        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+        return self.parenthesize(LEXEMES[expr.operator], expr.left, expr.right)
+
+    def visitCallExpr(self, expr: Call):
+        return self.parenthesize('call', expr.callee, *expr.arguments)
+
+    def visitGetExpr(self, expr: Get):
+        return self.parenthesize(f'. {expr.name.lexeme}', expr.object)
 
     def visitGroupingExpr(self, expr: Grouping):
         return self.parenthesize("group", expr.expression)
@@ -19,5 +31,20 @@ class AstPrinter(ExprVisitor):
     def visitLiteralExpr(self, expr: Literal):
         return str(expr.value) if expr.value is not None else 'nil'
 
+    def visitLogicalExpr(self, expr: Logical):
+        return self.parenthesize(LEXEMES[expr.operator], expr.left, expr.right)
+
+    def visitSetExpr(self, expr: Set):
+        return self.parenthesize(f'= . {expr.name.lexeme}', expr.object, expr.value)
+
+    def visitSuperExpr(self, expr: Super):
+        return f'(super {expr.method.lexeme})'
+
+    def visitThisExpr(self, expr: This):
+        return 'this'
+
     def visitUnaryExpr(self, expr: Unary):
-        return self.parenthesize(expr.operator.lexeme, expr.right)
+        return self.parenthesize(LEXEMES[expr.operator], expr.right)
+
+    def visitVariableExpr(self, expr: Variable):
+        return expr.name.lexeme
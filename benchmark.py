@@ -0,0 +1,569 @@
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from astcache import AstCache
+from classes import LoxClass, LoxInstance
+from closurecompiler import ClosureInterpreter
+from expressions import Binary, Get, Literal, NumberBinary
+from incremental import IncrementalFrontEnd
+from interpreter import Interpreter
+from lox import Lox
+from lowering import Lowering
+from memo import Memo
+from memstats import astMemory
+from operators import BINARY_OPERATORS
+from parser import Parser, PrattParser
+from scanner import Scanner, openSource
+from tokens import Token, TokenType
+from transpiler import Transpiler
+from typeinference import NUMBER_OPERATORS
+from vm import VM
+
+benchmarks = []
+
+
+def benchmark(fn):
+    benchmarks.append(fn)
+    return fn
+
+
+def bestOf(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peakMemory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retainedMemory(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def withEngine(interpreterClass):
+    lox = Lox()
+    lox.interpreter = interpreterClass()
+    return lox
+
+
+def runLox(source, lox=None):
+    lox = lox or Lox()
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.run(source)
+
+
+def timeLox(title, source, lox=None):
+    elapsed = bestOf(lambda: runLox(source, lox))
+    print(f'{title:>16}: {elapsed:.3f}s')
+    return elapsed
+
+
+def corpus(minSize):
+    programs = ''.join(open(path).read() + '\n' for path in sorted(glob.glob('programs/*.lox')))
+    return programs * (minSize // len(programs) + 1)
+
+
+@benchmark
+def scanner():
+    source = corpus(1_000_000)
+    megabytes = len(source.encode()) / 1_000_000
+    print(f'Scanning {megabytes:.2f} MB')
+    for engine in ['char', 'regex']:
+        elapsed = bestOf(lambda: Scanner(source, engine).scanTokens(), repeat=1 if engine == 'char' else 3)
+        print(f'{engine:>8}: {elapsed:.3f}s, {megabytes / elapsed:.2f} MB/s')
+
+
+@benchmark
+def streaming():
+    with tempfile.NamedTemporaryFile('w', suffix='.lox', delete=False) as script:
+        script.write(corpus(1_000_000))
+    try:
+        def listed():
+            with open(script.name) as sourceFile:
+                tokens = Scanner(sourceFile.read()).scanTokens()
+            return Parser(tokens).parse()
+
+        def streamed():
+            with openSource(script.name) as source:
+                return Parser(Scanner(source).iterTokens()).parse()
+
+        for title, fn in [('list', listed), ('stream', streamed)]:
+            elapsed = bestOf(fn)
+            peak = peakMemory(fn)
+            print(f'{title:>8}: {elapsed:.3f}s, peak {peak / 1_000_000:.1f} MB')
+    finally:
+        os.remove(script.name)
+
+
+@benchmark
+def tokenMemory():
+    source = corpus(1_000_000)
+    print(f'Source: {len(source) / 1_000_000:.2f} MB')
+    for title, fn in [('list', lambda: Scanner(source).scanTokens()), ('compact', lambda: Scanner(source).scanCompact())]:
+        tokens, retained = retainedMemory(fn)
+        print(f'{title:>8}: {len(tokens)} tokens, {retained / 1_000_000:.1f} MB, {retained / len(tokens):.1f} bytes/token')
+
+
+@benchmark
+def interning():
+    source = ''.join(open(path).read() for path in sorted(glob.glob('programs/classes*.lox')))
+    names = [token.lexeme for token in Scanner(source).scanTokens() if token.type == TokenType.IDENTIFIER]
+    print(f'classes*.lox: {len(names)} identifiers, {len(set(names))} distinct')
+
+    # The same lookups a LoxInstance.fields or Environment.values dict sees, with keys that are identical objects
+    # versus equal but separately sliced strings, as the scanner produced before interning.
+    table = {name: None for name in names}
+    sliced = [name[:1] + name[1:] for name in names]
+    rounds = 2000
+
+    def lookUp(keys):
+        for _ in range(rounds):
+            for key in keys:
+                table[key]
+
+    interned = bestOf(lambda: lookUp(names))
+    copies = bestOf(lambda: lookUp(sliced))
+    count = rounds * len(names)
+    print(f'  interned: {interned / count * 1e9:.1f} ns/lookup')
+    print(f'    sliced: {copies / count * 1e9:.1f} ns/lookup ({(copies - interned) / copies:.1%} saved by interning)')
+
+
+@benchmark
+def parser():
+    tokens = Scanner(corpus(1_000_000)).scanTokens()
+    for parserClass in [Parser, PrattParser]:
+        elapsed = bestOf(lambda: parserClass(tokens).parse())
+        print(f'{parserClass.__name__:>12}: {elapsed:.3f}s, {len(tokens) / elapsed / 1000:.0f}k tokens/s')
+
+
+@benchmark
+def incremental():
+    lines = [f'fun f{i}(a, b) {{ var c = a * {i}; return c + b; }}\nprint f{i}(1, 2);' for i in range(5000)]
+    print(f'Buffer: {len(lines) * 2} lines')
+    frontEnd = IncrementalFrontEnd()
+    print(f'   initial: {bestOf(lambda: frontEnd.update(chr(10).join(lines)), repeat=1):.3f}s')
+    for title, edit in [('change', lambda i: lines[i].replace('* ', '+ ')), ('insert', lambda i: '\n' + lines[i])]:
+        def editLine():
+            edited = lines[:]
+            edited[len(lines) // 2] = edit(len(lines) // 2)
+            frontEnd.update('\n'.join(edited))
+            frontEnd.update('\n'.join(lines))
+        print(f'{title:>10}: {bestOf(editLine) / 2 * 1000:.2f}ms per edit')
+
+
+@benchmark
+def astCache():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'script.lox')
+        with open(path, 'w') as script:
+            script.write('\n'.join(f'fun f{i}(a, b) {{ var c = a * {i}; return c + b; }}' for i in range(5000)))
+        with openSource(path) as source:
+            lox = Lox()
+            cache = AstCache(path, source)
+            cache.store(lox.analyze(source))
+            print(f'Cache file: {os.path.getsize(cache.path) / 1000:.0f} kB for {len(source) / 1000:.0f} kB of source')
+            print(f'  front end: {bestOf(lambda: lox.analyze(source)) * 1000:.1f}ms')
+            print(f' cache load: {bestOf(lambda: AstCache(path, source).load()) * 1000:.1f}ms')
+    finally:
+        shutil.rmtree(directory)
+
+
+@benchmark
+def astSize():
+    source = corpus(1_000_000)
+    statements, retained = retainedMemory(lambda: PrattParser(Scanner(source).iterTokens()).parse())
+    usage = astMemory(statements)
+    count = sum(count for count, size in usage.values())
+    print(f'AST of {len(source) / 1_000_000:.2f} MB source: {retained / 1_000_000:.1f} MB, {count} objects')
+    for name, (count, size) in sorted(usage.items(), key=lambda item: -item[1][1])[:5]:
+        print(f'{name:>12}: {size / count:.0f} bytes each')
+
+
+VARIABLE_LOOP = '''
+fun loop() {
+  var a = 0;
+  var b = 1;
+  var temp;
+  for (var i = 0; i < 100000; i = i + 1) {
+    temp = a;
+    a = b;
+    b = temp + b;
+  }
+  return a;
+}
+print loop();
+'''
+
+GLOBAL_LOOP = '''
+var a = 0;
+var b = 1;
+var temp;
+fun loop() {
+  for (var i = 0; i < 100000; i = i + 1) {
+    temp = a;
+    a = b;
+    b = temp + b;
+  }
+  return a;
+}
+print loop();
+'''
+
+
+@benchmark
+def variables():
+    timeLox('fibFor.lox', open('programs/fibFor.lox').read())
+    timeLox('local loop', VARIABLE_LOOP)
+    timeLox('global loop', GLOBAL_LOOP)
+    timeLox('fibRecurse.lox', open('programs/fibRecurse.lox').read())
+
+
+@benchmark
+def engines():
+    sources = [('fibRecurse.lox', open('programs/fibRecurse.lox').read()), ('local loop', VARIABLE_LOOP),
+               ('global loop', GLOBAL_LOOP)]
+    for title, source in sources:
+        print(title)
+        for interpreterClass in [Interpreter, ClosureInterpreter, VM]:
+            timeLox(interpreterClass.__name__, source, withEngine(interpreterClass))
+
+
+TAIL_LOOP = '''
+fun loop(n, total) {
+  if (n == 0) return total;
+  return loop(n - 1, total + n);
+}
+print loop(100000, 0);
+'''
+
+
+@benchmark
+def tailCalls():
+    for interpreterClass in [Interpreter, ClosureInterpreter, VM]:
+        timeLox(interpreterClass.__name__, TAIL_LOOP, withEngine(interpreterClass))
+
+
+CONSTANT_LOOP = '''
+fun loop() {
+  var seconds = 0;
+  for (var day = 0; day < 100000; day = day + 1) {
+    seconds = seconds + 24 * 60 * 60;
+    if (!true) seconds = 0;
+  }
+  return seconds;
+}
+print loop();
+'''
+
+
+def withOptimization(level):
+    lox = Lox()
+    lox.optimize = level
+    return lox
+
+
+@benchmark
+def optimizer():
+    for level in [0, 1]:
+        timeLox(f'-O{level}', CONSTANT_LOOP, withOptimization(level))
+
+
+@benchmark
+def typeInference():
+    for title, source in [('local loop', VARIABLE_LOOP), ('fibRecurse.lox', open('programs/fibRecurse.lox').read())]:
+        for level in [1, 2]:
+            timeLox(f'{title} -O{level}', source, withOptimization(level))
+
+    interpreter = Interpreter()
+    rounds = 200_000
+    for operator in NUMBER_OPERATORS:
+        generic = Binary(Literal(3.0), operator, Literal(2.0))
+        number = NumberBinary(Literal(3.0), operator, Literal(2.0), function=NUMBER_OPERATORS[operator])
+        times = [bestOf(lambda: [interpreter.evaluate(node) for _ in range(rounds)]) for node in [generic, number]]
+        print(f'{operator.name:>16}: {times[0] / rounds * 1e9:.0f} ns generic, {times[1] / rounds * 1e9:.0f} ns number')
+
+
+@benchmark
+def transpiler():
+    for title, source in [('fibRecurse.lox', open('programs/fibRecurse.lox').read()), ('local loop', VARIABLE_LOOP)]:
+        print(title)
+        timeLox('Interpreter', source)
+        module = compile(Transpiler().transpile(Lox().analyze(source)), title, 'exec')
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = bestOf(lambda: exec(module, {'__name__': title}))
+        print(f'{"transpiled":>16}: {elapsed:.3f}s')
+
+
+FIELD_LOOP = '''
+class Counter {
+  init() {
+    this.count = 0;
+  }
+}
+fun loop() {
+  var counter = Counter();
+  for (var i = 0; i < 100000; i = i + 1) {
+    counter.count = counter.count + i;
+  }
+  return counter.count;
+}
+print loop();
+'''
+
+
+def branchingBinary(interpreter, expr):
+    # How Interpreter evaluated a Binary before it looked its operator up in BINARY_OPERATORS, for comparison.
+    left = interpreter.evaluate(expr.left)
+    right = interpreter.evaluate(expr.right)
+    if expr.operator == TokenType.MINUS:
+        return left - right
+    if expr.operator == TokenType.PLUS:
+        return left + right
+    if expr.operator == TokenType.SLASH:
+        return left / right
+    if expr.operator == TokenType.STAR:
+        return left * right
+    if expr.operator == TokenType.GREATER:
+        return left > right
+    if expr.operator == TokenType.GREATER_EQUAL:
+        return left >= right
+    if expr.operator == TokenType.LESS:
+        return left < right
+    if expr.operator == TokenType.LESS_EQUAL:
+        return left <= right
+    if expr.operator == TokenType.EQUAL_EQUAL:
+        return left == right
+    if expr.operator == TokenType.BANG_EQUAL:
+        return left != right
+
+
+@benchmark
+def operators():
+    interpreter = Interpreter()
+    rounds = 200_000
+    for operator in BINARY_OPERATORS:
+        node = Binary(Literal(3.0), operator, Literal(2.0))
+        times = [
+            bestOf(lambda: [evaluate(interpreter, node) for _ in range(rounds)])
+            for evaluate in [branchingBinary, Interpreter.visitBinaryExpr]
+        ]
+        print(f'{operator.name:>16}: {times[0] / rounds * 1e9:.0f} ns branching, {times[1] / rounds * 1e9:.0f} ns table')
+
+    for title, source in [('local loop', VARIABLE_LOOP), ('field loop', FIELD_LOOP)]:
+        for lower in [False, True]:
+            statements = Lox().analyze(source)
+            if lower:
+                Lowering().lowerStatements(statements)
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = bestOf(lambda: Interpreter().interpret(statements))
+            print(f'{title:>16}: {elapsed:.3f}s {"with" if lower else "without"} superinstructions')
+
+
+DEEP_HIERARCHY = '''
+class A {
+  init() {
+    this.x = 1;
+  }
+  method() {
+    return 1;
+  }
+}
+class B < A {}
+class C < B {}
+class D < C {}
+class E < D {}
+'''
+
+DEEP_FIELD_LOOP = DEEP_HIERARCHY + '''
+fun loop() {
+  var e = E();
+  var total = 0;
+  for (var i = 0; i < 100000; i = i + 1) {
+    total = total + e.x;
+  }
+  return total;
+}
+print loop();
+'''
+
+DEEP_METHOD_LOOP = DEEP_HIERARCHY + '''
+fun loop() {
+  var e = E();
+  var total = 0;
+  for (var i = 0; i < 100000; i = i + 1) {
+    total = total + e.method();
+  }
+  return total;
+}
+print loop();
+'''
+
+
+def walkHierarchy(cls, name):
+    # How methods were found before classes had a vtable.
+    return cls.methods.get(name) or (cls.superclass and walkHierarchy(cls.superclass, name))
+
+
+class DictInstance:
+    # How LoxInstance kept its fields before shapes.
+    def __init__(self, cls):
+        self.cls = cls
+        self.fields = {}
+
+
+def getUncached(instance, name):
+    # How property reads went before inline caches: a walk up the classes for a method, then the instance's fields.
+    if method := walkHierarchy(instance.cls, name.lexeme):
+        return method.bind(instance)
+    return instance.fields[name.lexeme]
+
+
+@benchmark
+def inlineCaches():
+    timeLox('field reads', DEEP_FIELD_LOOP)
+    timeLox('method calls', DEEP_METHOD_LOOP)
+
+    lox = Lox()
+    lox.run(DEEP_HIERARCHY + 'var e = E();')
+    interpreter = lox.interpreter
+    instance = interpreter.globals.get(Token(TokenType.IDENTIFIER, 'e', None, 1))
+    unshaped = DictInstance(instance.cls)
+    unshaped.fields = {name: instance.values[index] for name, index in instance.shape.indices.items()}
+    rounds = 200_000
+    for name in ['x', 'method']:
+        expr = Get(None, Token(TokenType.IDENTIFIER, name, None, 1))
+        uncached = bestOf(lambda: [getUncached(unshaped, expr.name) for _ in range(rounds)])
+        cached = bestOf(lambda: [interpreter.getProperty(instance, expr) for _ in range(rounds)])
+        print(f'{name:>16}: {uncached / rounds * 1e9:.0f} ns uncached, {cached / rounds * 1e9:.0f} ns cached')
+
+
+
+METHOD_LOOP = '''
+class Counter {
+  init() {
+    this.total = 0;
+  }
+  add(n) {
+    this.total = this.total + n;
+    return this;
+  }
+}
+fun loop() {
+  var counter = Counter();
+  for (var i = 0; i < 100000; i = i + 1) {
+    CALL;
+  }
+  return counter.total;
+}
+print loop();
+'''
+
+
+@benchmark
+def methodCalls():
+    # Parenthesizing the callee makes it a plain call of a Get, which binds the method to a new function first.
+    for name, engine in [('tree', Interpreter), ('closure', ClosureInterpreter)]:
+        bound = timeLox(f'{name} bound', METHOD_LOOP.replace('CALL', '(counter.add)(i)'), withEngine(engine))
+        invoked = timeLox(f'{name} invoked', METHOD_LOOP.replace('CALL', 'counter.add(i)'), withEngine(engine))
+        print(f'{"speedup":>16}: {bound / invoked:.2f}x')
+
+
+DEEP_CREATE_LOOP = DEEP_HIERARCHY + '''
+fun loop() {
+  var e;
+  for (var i = 0; i < 100000; i = i + 1) {
+    e = E();
+  }
+  return e.x;
+}
+print loop();
+'''
+
+
+@benchmark
+def methodTables():
+    timeLox('deep calls', DEEP_METHOD_LOOP)
+    timeLox('deep creation', DEEP_CREATE_LOOP)
+
+    lox = Lox()
+    lox.run(DEEP_HIERARCHY)
+    cls = lox.interpreter.globals.get(Token(TokenType.IDENTIFIER, 'E', None, 1))
+    rounds = 200_000
+    for name in ['method', 'init', 'missing']:
+        walked = bestOf(lambda: [walkHierarchy(cls, name) for _ in range(rounds)])
+        flat = bestOf(lambda: [cls.findMethod(name) for _ in range(rounds)])
+        print(f'{name:>16}: {walked / rounds * 1e9:.0f} ns walked, {flat / rounds * 1e9:.0f} ns flattened')
+
+
+@benchmark
+def shapes():
+    cls = LoxClass('Point', None, {})
+    names = ['x', 'y', 'z']
+    count = 10_000
+
+    def withDicts():
+        instances = [DictInstance(cls) for _ in range(count)]
+        for instance in instances:
+            for name in names:
+                instance.fields[name] = 1.0
+        return instances
+
+    def withShapes():
+        instances = [LoxInstance(cls) for _ in range(count)]
+        for instance in instances:
+            for name in names:
+                instance.put(name, 1.0)
+        return instances
+
+    for title, fn in [('dict fields', withDicts), ('shaped fields', withShapes)]:
+        _, memory = retainedMemory(fn)
+        print(f'{title:>16}: {memory / count:.0f} bytes per instance')
+
+    timeLox('field updates', FIELD_LOOP)
+    timeLox('deep field reads', DEEP_FIELD_LOOP)
+
+
+def withMemoization(interpreterClass):
+    lox = withEngine(interpreterClass)
+    lox.memoize = True
+    return lox
+
+
+@benchmark
+def memoization():
+    source = open('programs/fibRecurse.lox').read()
+    for name, engine in [('tree', Interpreter), ('closure', ClosureInterpreter)]:
+        plain = timeLox(f'{name}', source, withEngine(engine))
+        memoized = timeLox(f'{name} memoized', source, withMemoization(engine))
+        print(f'{"speedup":>16}: {plain / memoized:.1f}x')
+    print(f'{"hit rate":>16}: {Memo.stats()["hit rate"]}')
+
+if __name__ == '__main__':
+    selected = sys.argv[1:]
+    for fn in benchmarks:
+        if not selected or fn.__name__ in selected:
+            print(f'\nBenchmarking {fn.__name__}')
+            fn()
@@ -0,0 +1,455 @@
+from array import array
+from enum import IntEnum, auto
+
+from classes import INIT_METHOD_NAME
+from environment import GlobalEnvironment
+from expressions import Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Expr, Get, Set, This, Super
+from exprvisitor import ExprVisitor
+from functions import FunctionType
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from stmtvisitor import StmtVisitor
+from tokens import TokenType
+from util import Errors
+
+
+class OpCode(IntEnum):
+    # Operands follow the opcode: one byte for local and upvalue slots and argument counts, two bytes (high byte
+    # first) for constant and global indices and jump offsets.
+    CONSTANT = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    GET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_PROPERTY = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    NOT = auto()
+    NEGATE = auto()
+    PRINT = auto()
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    LOOP = auto()
+    CALL = auto()
+    INVOKE = auto()
+    SUPER_INVOKE = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+
+BINARY_OPCODES = {
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+}
+
+
+class Chunk:
+    def __init__(self):
+        self.code = bytearray()
+        self.lines = array('L')
+        self.constants = []
+        self.constantIndices = {}
+
+    def write(self, byte, line):
+        self.code.append(byte)
+        self.lines.append(line)
+
+    def addConstant(self, value):
+        # Numbers and strings are shared; the type is part of the key so that 1.0 and True stay apart.
+        key = (type(value), value) if isinstance(value, (float, str)) else id(value)
+        index = self.constantIndices.get(key)
+        if index is None:
+            index = self.constantIndices[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+
+class VmFunction:
+    def __init__(self, name, arity=0):
+        self.name = name
+        self.arity = arity
+        self.upvalueCount = 0
+        self.chunk = Chunk()
+
+    def __str__(self):
+        return f'<fn {self.name}>' if self.name else '<script>'
+
+
+class Local:
+    __slots__ = ('name', 'depth', 'isCaptured')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.isCaptured = False
+
+
+class FunctionState:
+    # What the compiler tracks for the function it is in the middle of: its locals, in stack order, and the variables
+    # of enclosing functions it captures. Slot 0 holds the callee, or `this` in methods.
+    def __init__(self, enclosing, function: VmFunction, functionType: FunctionType):
+        self.enclosing = enclosing
+        self.function = function
+        self.type = functionType
+        self.locals = [Local('' if functionType in (FunctionType.FUNCTION, FunctionType.NONE) else 'this', 0)]
+        self.upvalues = []
+        self.scopeDepth = 0
+
+    def resolveLocal(self, name):
+        for slot in range(len(self.locals) - 1, -1, -1):
+            if self.locals[slot].name == name:
+                return slot
+        return None
+
+    def resolveUpvalue(self, name, line):
+        if self.enclosing is None:
+            return None
+        local = self.enclosing.resolveLocal(name)
+        if local is not None:
+            self.enclosing.locals[local].isCaptured = True
+            return self.addUpvalue(local, True, line)
+        upvalue = self.enclosing.resolveUpvalue(name, line)
+        if upvalue is not None:
+            return self.addUpvalue(upvalue, False, line)
+        return None
+
+    def addUpvalue(self, index, isLocal, line):
+        if (index, isLocal) in self.upvalues:
+            return self.upvalues.index((index, isLocal))
+        if len(self.upvalues) > 0xff:
+            # Like clox, report it and carry on with an index that still fits in an operand; nothing runs.
+            Errors.errorAt(line, 'Too many closure variables in function.')
+            return 0
+        self.upvalues.append((index, isLocal))
+        self.function.upvalueCount = len(self.upvalues)
+        return len(self.upvalues) - 1
+
+
+class BytecodeCompiler(ExprVisitor, StmtVisitor):
+    # Compiles resolved statements to bytecode for the VM, the way clox does: locals live on the VM's stack and are
+    # found by name here, at compile time, and variables captured by closures become upvalues. Globals are numbered
+    # with the VM's GlobalEnvironment, so they are looked up by index too.
+    def __init__(self, globals: GlobalEnvironment):
+        self.globals = globals
+        self.state = None
+        self.line = 1
+
+    def compile(self, statements):
+        self.state = FunctionState(None, VmFunction(None), FunctionType.NONE)
+        if statements and isinstance(statements[-1], Expression):
+            # The value of a trailing expression statement is the result of the script, as in Interpreter.
+            self.compileStatements(statements[:-1])
+            self.expression(statements[-1].expression)
+        else:
+            self.compileStatements(statements)
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+        return self.state.function
+
+    def compileStatements(self, statements):
+        for statement in statements:
+            if isinstance(statement, Expr):
+                # For loops put their increment straight into the body's statement list.
+                self.expression(statement)
+                self.emit(OpCode.POP)
+            else:
+                statement.accept(self)
+
+    def expression(self, expr: Expr):
+        expr.accept(self)
+
+    @property
+    def chunk(self):
+        return self.state.function.chunk
+
+    def emit(self, *values):
+        for value in values:
+            self.chunk.write(value, self.line)
+
+    def emitShort(self, op, value):
+        self.emit(op, value >> 8, value & 0xff)
+
+    def emitConstant(self, op, value):
+        index = self.chunk.addConstant(value)
+        if index > 0xffff:
+            Errors.errorAt(self.line, 'Too many constants in one chunk.')
+        self.emitShort(op, index)
+
+    def emitJump(self, op):
+        self.emit(op, 0xff, 0xff)
+        return len(self.chunk.code) - 2
+
+    def patchJump(self, offset):
+        jump = len(self.chunk.code) - offset - 2
+        if jump > 0xffff:
+            Errors.errorAt(self.line, 'Too much code to jump over.')
+        self.chunk.code[offset] = jump >> 8 & 0xff
+        self.chunk.code[offset + 1] = jump & 0xff
+
+    def emitLoop(self, start):
+        offset = len(self.chunk.code) - start + 3
+        if offset > 0xffff:
+            Errors.errorAt(self.line, 'Loop body too large.')
+        self.emitShort(OpCode.LOOP, offset & 0xffff)
+
+    def beginScope(self):
+        self.state.scopeDepth += 1
+
+    def endScope(self):
+        state = self.state
+        state.scopeDepth -= 1
+        while state.locals and state.locals[-1].depth > state.scopeDepth:
+            self.emit(OpCode.CLOSE_UPVALUE if state.locals.pop().isCaptured else OpCode.POP)
+
+    def addLocal(self, name):
+        if len(self.state.locals) > 0xff:
+            Errors.errorAt(self.line, 'Too many local variables in function.')
+            return
+        self.state.locals.append(Local(name, self.state.scopeDepth))
+
+    def defineVariable(self, name):
+        # The value to store is on top of the stack. A local just stays there.
+        if self.state.scopeDepth:
+            self.addLocal(name)
+        else:
+            self.emitShort(OpCode.DEFINE_GLOBAL, self.globals.index(name))
+
+    def namedVariable(self, name, assign=False):
+        slot = self.state.resolveLocal(name)
+        if slot is not None:
+            self.emit(OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL, slot)
+            return
+        upvalue = self.state.resolveUpvalue(name, self.line)
+        if upvalue is not None:
+            self.emit(OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE, upvalue)
+            return
+        self.emitShort(OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL, self.globals.index(name))
+
+    def function(self, stmt: Function, functionType: FunctionType):
+        self.state = FunctionState(self.state, VmFunction(stmt.name.lexeme, len(stmt.params)), functionType)
+        self.beginScope()
+        for param in stmt.params:
+            self.addLocal(param.lexeme)
+        self.compileStatements(stmt.body)
+        self.emitReturn()
+
+        state = self.state
+        self.state = state.enclosing
+        self.emitConstant(OpCode.CLOSURE, state.function)
+        for index, isLocal in state.upvalues:
+            self.emit(1 if isLocal else 0, index)
+
+    def emitReturn(self):
+        if self.state.type == FunctionType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        self.expression(expr.value)
+        self.line = expr.name.line
+        self.namedVariable(expr.name.lexeme, assign=True)
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.expression(expr.left)
+        self.expression(expr.right)
+        self.line = expr.line
+        self.emit(BINARY_OPCODES[expr.operator])
+
+    def visitCallExpr(self, expr: Call):
+        if isinstance(expr.callee, Get):
+            self.expression(expr.callee.object)
+            for argument in expr.arguments:
+                self.expression(argument)
+            self.line = expr.callee.name.line
+            self.emitConstant(OpCode.INVOKE, expr.callee.name.lexeme)
+        elif isinstance(expr.callee, Super):
+            self.namedVariable('this')
+            for argument in expr.arguments:
+                self.expression(argument)
+            self.namedVariable('super')
+            self.line = expr.callee.method.line
+            self.emitConstant(OpCode.SUPER_INVOKE, expr.callee.method.lexeme)
+        else:
+            self.expression(expr.callee)
+            for argument in expr.arguments:
+                self.expression(argument)
+            self.line = expr.paren.line
+            self.emit(OpCode.CALL)
+        self.emit(len(expr.arguments))
+
+    def visitGetExpr(self, expr: Get):
+        self.expression(expr.object)
+        self.line = expr.name.line
+        self.emitConstant(OpCode.GET_PROPERTY, expr.name.lexeme)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.expression(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emitConstant(OpCode.CONSTANT, expr.value)
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.expression(expr.left)
+        self.line = expr.line
+        if expr.operator == TokenType.AND:
+            end = self.emitJump(OpCode.JUMP_IF_FALSE)
+        else:
+            elseJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+            end = self.emitJump(OpCode.JUMP)
+            self.patchJump(elseJump)
+        self.emit(OpCode.POP)
+        self.expression(expr.right)
+        self.patchJump(end)
+
+    def visitSetExpr(self, expr: Set):
+        self.expression(expr.object)
+        self.expression(expr.value)
+        self.line = expr.name.line
+        self.emitConstant(OpCode.SET_PROPERTY, expr.name.lexeme)
+
+    def visitSuperExpr(self, expr: Super):
+        self.line = expr.method.line
+        self.namedVariable('this')
+        self.namedVariable('super')
+        self.emitConstant(OpCode.GET_SUPER, expr.method.lexeme)
+
+    def visitThisExpr(self, expr: This):
+        self.line = expr.keyword.line
+        self.namedVariable('this')
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.expression(expr.right)
+        self.line = expr.line
+        self.emit(OpCode.NEGATE if expr.operator == TokenType.MINUS else OpCode.NOT)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.line = expr.name.line
+        self.namedVariable(expr.name.lexeme)
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        self.beginScope()
+        self.compileStatements(stmt.statements)
+        self.endScope()
+
+    def visitClassStmt(self, stmt: Class):
+        name = stmt.name.lexeme
+        self.line = stmt.name.line
+        self.emitConstant(OpCode.CLASS, name)
+        self.defineVariable(name)
+
+        if stmt.superclass:
+            self.visitVariableExpr(stmt.superclass)
+            self.beginScope()
+            self.addLocal('super')
+            self.namedVariable(name)
+            self.emitConstant(OpCode.INHERIT, stmt.superclass.name.lexeme)
+
+        self.namedVariable(name)
+        for method in stmt.methods:
+            self.line = method.name.line
+            isInitializer = method.name.lexeme == INIT_METHOD_NAME
+            self.function(method, FunctionType.INITIALIZER if isInitializer else FunctionType.METHOD)
+            self.emitConstant(OpCode.METHOD, method.name.lexeme)
+        self.emit(OpCode.POP)
+
+        if stmt.superclass:
+            self.endScope()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.expression(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.line = stmt.name.line
+        if self.state.scopeDepth:
+            # Declared before the body is compiled, so that the function can refer to itself.
+            self.addLocal(stmt.name.lexeme)
+            self.function(stmt, FunctionType.FUNCTION)
+        else:
+            self.function(stmt, FunctionType.FUNCTION)
+            self.defineVariable(stmt.name.lexeme)
+
+    def visitIfStmt(self, stmt: If):
+        self.expression(stmt.condition)
+        thenJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compileStatements([stmt.thenBranch])
+        elseJump = self.emitJump(OpCode.JUMP)
+        self.patchJump(thenJump)
+        self.emit(OpCode.POP)
+        if stmt.elseBranch:
+            self.compileStatements([stmt.elseBranch])
+        self.patchJump(elseJump)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.expression(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visitReturnStmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if stmt.value:
+            self.expression(stmt.value)
+            self.emit(OpCode.RETURN)
+        else:
+            self.emitReturn()
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            self.expression(stmt.initializer)
+        else:
+            self.emit(OpCode.NIL)
+        self.line = stmt.name.line
+        self.defineVariable(stmt.name.lexeme)
+
+    def visitWhileStmt(self, stmt: While):
+        loopStart = len(self.chunk.code)
+        if stmt.condition is None:
+            self.compileStatements([stmt.body])
+            self.emitLoop(loopStart)
+            return
+        self.expression(stmt.condition)
+        exitJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compileStatements([stmt.body])
+        self.emitLoop(loopStart)
+        self.patchJump(exitJump)
+        self.emit(OpCode.POP)
@@ -1,6 +1,7 @@
 from enum import Enum, auto
 
 from environment import LoxRuntimeError
+from shapes import Shape
 from tokens import Token
 
 INIT_METHOD_NAME = 'init'
@@ -13,46 +14,72 @@ class ClassType(Enum):
 
 
 class LoxClass:
+    # The methods of the superclass are copied down into `vtable` when the class is created, under its own, so finding
+    # any method is one lookup however deep the hierarchy is. The initializer is found once, for every instantiation.
     def __init__(self, name, superclass, methods):
         self.name = name
-        self.superclass = superclass
+        self.superclass = None
         self.methods = methods
+        self.vtable = dict(methods)
+        self.initializer = methods.get(INIT_METHOD_NAME)
+        self.shape = Shape(self, {})
+        if superclass:
+            self.inherit(superclass)
 
     def __str__(self):
         return f'{self.name}'
 
+    def inherit(self, superclass):
+        self.superclass = superclass
+        self.vtable = {**superclass.vtable, **self.methods}
+        self.initializer = self.vtable.get(INIT_METHOD_NAME)
+
+    def addMethod(self, name, method):
+        self.methods[name] = method
+        self.vtable[name] = method
+        if name == INIT_METHOD_NAME:
+            self.initializer = method
+
     def findMethod(self, name):
-        return self.methods.get(name) or (
-            self.superclass and self.superclass.findMethod(name)
-        )
+        return self.vtable.get(name)
 
     def call(self, interpreter, arguments):
         instance = LoxInstance(self)
-        if initializer := self.findMethod(INIT_METHOD_NAME):
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer:
+            self.initializer.invoke(interpreter, instance, arguments)
         return instance
 
     def arity(self):
-        if initializer := self.findMethod(INIT_METHOD_NAME):
-            return initializer.arity()
-        return 0
+        return self.initializer.arity() if self.initializer else 0
 
 
 class LoxInstance:
+    # Fields are kept in `values`, in the order they were added; the instance's shape says which is where.
+    __slots__ = ('cls', 'shape', 'values')
+
     def __init__(self, cls: LoxClass):
         self.cls = cls
-        self.fields = {}
+        self.shape = cls.shape
+        self.values = []
 
     def __str__(self):
         return f'{self.cls} instance'
 
     def get(self, name: Token):
-        try:
-            if method := self.cls.findMethod(name.lexeme):
-                return method.bind(self)
-            return self.fields[name.lexeme]
-        except KeyError:
+        if method := self.cls.findMethod(name.lexeme):
+            return method.bind(self)
+        index = self.shape.indices.get(name.lexeme)
+        if index is None:
             raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'")
+        return self.values[index]
 
     def set(self, name: Token, value):
-        self.fields[name.lexeme] = value
+        self.put(name.lexeme, value)
+
+    def put(self, name, value):
+        index = self.shape.indices.get(name)
+        if index is None:
+            self.shape = self.shape.withField(name)
+            self.values.append(value)
+        else:
+            self.values[index] = value
@@ -0,0 +1,406 @@
+from classes import LoxClass, LoxInstance, INIT_METHOD_NAME
+from environment import Environment, GlobalEnvironment, LoxRuntimeError, UNDEFINED
+from expressions import (
+    Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Get, Set, This, Super, Invoke,
+)
+from exprvisitor import ExprVisitor
+from functions import Clock, RETURNING
+from memo import Memo
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from stmtvisitor import StmtVisitor
+from tokens import Token, TokenType
+from util import Errors
+
+
+class CompiledFunction:
+    # LoxFunction's counterpart for compiled code: the body is a closure built once per declaration. Methods take their
+    # `this` in slot 0 of their frame, the same way.
+    def __init__(self, name, params, size, body, closure: Environment, isInitializer, isMethod=False, this=None):
+        self.name = name
+        self.params = params
+        self.size = size
+        self.body = body
+        self.closure = closure
+        self.isInitializer = isInitializer
+        self.isMethod = isMethod or isInitializer
+        self.this = this
+        self.memo = None
+
+    def bind(self, instance: LoxInstance):
+        return CompiledFunction(
+            self.name, self.params, self.size, self.body, self.closure, self.isInitializer, self.isMethod, instance
+        )
+
+    def arity(self):
+        return len(self.params)
+
+    def call(self, interpreter, arguments):
+        if self.memo is not None:
+            return self.memo.call(self, interpreter, arguments)
+        return self.invoke(interpreter, self.this, arguments)
+
+    def invoke(self, interpreter, this, arguments):
+        function = self
+        while True:
+            environment = Environment(function.closure, function.size)
+            if function.isMethod:
+                environment.values[0] = this
+                environment.values[1:len(arguments) + 1] = arguments
+            else:
+                environment.values[:len(arguments)] = arguments
+            completion = function.body(environment)
+            if function.isInitializer:
+                return this
+            if completion is not RETURNING:
+                return None
+            if RETURNING.function is None:
+                return RETURNING.value
+            function, arguments, this = RETURNING.function, RETURNING.arguments, RETURNING.this
+            RETURNING.function = None
+
+
+def callValue(function, values):
+    try:
+        if len(values) != function.arity():
+            raise Exception(f'Expected {function.arity()} arguments but got {len(values)}.')
+        return function.call(None, values)
+    except AttributeError:
+        raise Exception('Can only call functions and classes.')
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    # Turns each resolved node into a Python closure taking the current environment. Everything that can be decided
+    # by looking at the node (operator, variable name, scope depth) is decided here, once, instead of on every
+    # evaluation.
+    def __init__(self, globals: GlobalEnvironment):
+        self.globals = globals
+
+    def compile(self, node):
+        return node.accept(self)
+
+    def compileStatements(self, statements):
+        compiled = tuple(self.compile(statement) for statement in statements)
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run(environment):
+            for statement in compiled:
+                if statement(environment) is RETURNING:
+                    return RETURNING
+        return run
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        value = self.compile(expr.value)
+        depth, slot = expr.depth, expr.slot
+        if depth is None:
+            token = expr.name
+            index = self.globals.index(token.lexeme)
+            assign = self.globals.assignAt
+
+            def assignGlobal(environment):
+                result = value(environment)
+                assign(index, token, result)
+                return result
+            return assignGlobal
+
+        if depth == 0:
+            def assignHere(environment):
+                environment.values[slot] = result = value(environment)
+                return result
+            return assignHere
+
+        def assignLocal(environment):
+            result = value(environment)
+            environment.ancestor(depth).values[slot] = result
+            return result
+        return assignLocal
+
+    def visitBinaryExpr(self, expr: Binary):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+
+        if operator == TokenType.MINUS:
+            return lambda environment: left(environment) - right(environment)
+        if operator == TokenType.PLUS:
+            return lambda environment: left(environment) + right(environment)
+        if operator == TokenType.SLASH:
+            return lambda environment: left(environment) / right(environment)
+        if operator == TokenType.STAR:
+            return lambda environment: left(environment) * right(environment)
+        if operator == TokenType.GREATER:
+            return lambda environment: left(environment) > right(environment)
+        if operator == TokenType.GREATER_EQUAL:
+            return lambda environment: left(environment) >= right(environment)
+        if operator == TokenType.LESS:
+            return lambda environment: left(environment) < right(environment)
+        if operator == TokenType.LESS_EQUAL:
+            return lambda environment: left(environment) <= right(environment)
+        if operator == TokenType.EQUAL_EQUAL:
+            return lambda environment: left(environment) == right(environment)
+        if operator == TokenType.BANG_EQUAL:
+            return lambda environment: left(environment) != right(environment)
+
+    def visitCallExpr(self, expr: Call):
+        callee = self.compile(expr.callee)
+        arguments = tuple(self.compile(argument) for argument in expr.arguments)
+
+        def call(environment):
+            return callValue(callee(environment), [argument(environment) for argument in arguments])
+        return call
+
+    def visitInvokeExpr(self, expr: Invoke):
+        obj = self.compile(expr.callee.object)
+        name = expr.callee.name
+        arguments = tuple(self.compile(argument) for argument in expr.arguments)
+
+        def invoke(environment):
+            instance = obj(environment)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, 'Only instances may have properties.')
+            method = instance.cls.findMethod(name.lexeme)
+            if not method:
+                return callValue(instance.get(name), [argument(environment) for argument in arguments])
+            values = [argument(environment) for argument in arguments]
+            if len(values) != len(method.params):
+                raise Exception(f'Expected {len(method.params)} arguments but got {len(values)}.')
+            return method.invoke(None, instance, values)
+        return invoke
+
+    def visitGetExpr(self, expr: Get):
+        obj = self.compile(expr.object)
+        name = expr.name
+
+        def getProperty(environment):
+            instance = obj(environment)
+            if isinstance(instance, LoxInstance):
+                return instance.get(name)
+            raise LoxRuntimeError(name, 'Only instances may have properties.')
+        return getProperty
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.compile(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        return lambda environment: value
+
+    def visitLogicalExpr(self, expr: Logical):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+
+        if expr.operator == TokenType.OR:
+            return lambda environment: left(environment) or right(environment)
+        return lambda environment: left(environment) and right(environment)
+
+    def visitSetExpr(self, expr: Set):
+        obj = self.compile(expr.object)
+        value = self.compile(expr.value)
+        name = expr.name
+
+        def setProperty(environment):
+            instance = obj(environment)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, 'Only instances have fields.')
+            result = value(environment)
+            instance.set(name, result)
+            return result
+        return setProperty
+
+    def visitSuperExpr(self, expr: Super):
+        depth = expr.depth
+        method = expr.method
+
+        def getSuperMethod(environment):
+            superclass = environment.getAt(depth, 0)
+            instance = environment.getAt(depth - 1, 0)
+            function = superclass.findMethod(method.lexeme)
+            if not function:
+                raise LoxRuntimeError(method, f"Undefined property '{method.lexeme}'.")
+            return function.bind(instance)
+        return getSuperMethod
+
+    def visitThisExpr(self, expr: This):
+        return self.lookUp(expr.keyword, expr.depth, expr.slot)
+
+    def visitUnaryExpr(self, expr: Unary):
+        right = self.compile(expr.right)
+        if expr.operator == TokenType.MINUS:
+            return lambda environment: -float(right(environment))
+        if expr.operator == TokenType.BANG:
+            return lambda environment: not right(environment)
+
+    def visitVariableExpr(self, expr: Variable):
+        return self.lookUp(expr.name, expr.depth, expr.slot)
+
+    def lookUp(self, token, depth, slot):
+        if depth is None:
+            values = self.globals.values
+            index = self.globals.index(token.lexeme)
+
+            def getGlobal(environment):
+                value = values[index]
+                if value is UNDEFINED:
+                    raise LoxRuntimeError(token, f"Undefined variable '{token.lexeme}'.")
+                return value
+            return getGlobal
+        if depth == 0:
+            return lambda environment: environment.values[slot]
+        if depth == 1:
+            return lambda environment: environment.enclosing.values[slot]
+        return lambda environment: environment.ancestor(depth).values[slot]
+
+    def define(self, name: Token, slot, value):
+        # Returns a closure storing value(environment) into the declared variable.
+        if slot is None:
+            define = self.globals.define
+            name = name.lexeme
+            return lambda environment: define(name, value(environment))
+
+        def defineLocal(environment):
+            environment.values[slot] = value(environment)
+        return defineLocal
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        body = self.compileStatements(stmt.statements)
+        size = stmt.size
+        if size is None:
+            if not Environment.counting:
+                return body
+
+            def runInPlace(environment):
+                Environment.elided += 1
+                return body(environment)
+            return runInPlace
+        return lambda environment: body(Environment(environment, size))
+
+    def visitClassStmt(self, stmt: Class):
+        name = stmt.name
+        superclassName = stmt.superclass and stmt.superclass.name
+        superclassExpr = stmt.superclass and self.compile(stmt.superclass)
+        methods = [
+            (method.name.lexeme, method.params, method.size, self.compileStatements(method.body))
+            for method in stmt.methods
+        ]
+
+        def createClass(environment):
+            superclass = None
+            if superclassExpr:
+                superclass = superclassExpr(environment)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(superclassName, "Superclass must be a class.")
+            closure = environment
+            if superclassExpr:
+                closure = Environment(environment, 1)
+                closure.values[0] = superclass
+
+            functions = {
+                methodName: CompiledFunction(
+                    methodName, params, size, body, closure, methodName == INIT_METHOD_NAME, True
+                )
+                for methodName, params, size, body in methods
+            }
+            return LoxClass(name.lexeme, superclass, functions)
+        return self.define(name, stmt.slot, createClass)
+
+    def visitExpressionStmt(self, stmt: Expression):
+        return self.compile(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Function):
+        name = stmt.name.lexeme
+        params = stmt.params
+        size = stmt.size
+        body = self.compileStatements(stmt.body)
+        pure = stmt.pure
+
+        def declareFunction(environment):
+            function = CompiledFunction(name, params, size, body, environment, False)
+            if pure:
+                function.memo = Memo(stmt)
+            return function
+        return self.define(stmt.name, stmt.slot, declareFunction)
+
+    def visitIfStmt(self, stmt: If):
+        condition = self.compile(stmt.condition)
+        thenBranch = self.compile(stmt.thenBranch)
+        if not stmt.elseBranch:
+            def ifThen(environment):
+                if condition(environment):
+                    return thenBranch(environment)
+            return ifThen
+
+        elseBranch = self.compile(stmt.elseBranch)
+
+        def ifThenElse(environment):
+            if condition(environment):
+                return thenBranch(environment)
+            return elseBranch(environment)
+        return ifThenElse
+
+    def visitPrintStmt(self, stmt: Print):
+        value = self.compile(stmt.expression)
+        return lambda environment: print(value(environment))
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.tailCall:
+            callee = self.compile(stmt.value.callee)
+            arguments = tuple(self.compile(argument) for argument in stmt.value.arguments)
+
+            def tailCall(environment):
+                function = callee(environment)
+                values = [argument(environment) for argument in arguments]
+                if type(function) is CompiledFunction and len(values) == len(function.params):
+                    RETURNING.function = function
+                    RETURNING.arguments = values
+                    RETURNING.this = function.this
+                else:
+                    RETURNING.value = callValue(function, values)
+                return RETURNING
+            return tailCall
+
+        value = self.compile(stmt.value) if stmt.value else None
+
+        def returnValue(environment):
+            RETURNING.value = value and value(environment)
+            return RETURNING
+        return returnValue
+
+    def visitVarStmt(self, stmt: Var):
+        initializer = self.compile(stmt.initializer) if stmt.initializer else lambda environment: None
+        return self.define(stmt.name, stmt.slot, initializer)
+
+    def visitWhileStmt(self, stmt: While):
+        body = self.compile(stmt.body)
+        if stmt.condition is None:
+            def loopForever(environment):
+                while True:
+                    if body(environment) is RETURNING:
+                        return RETURNING
+            return loopForever
+
+        condition = self.compile(stmt.condition)
+
+        def loop(environment):
+            while condition(environment):
+                if body(environment) is RETURNING:
+                    return RETURNING
+        return loop
+
+
+class ClosureInterpreter:
+    # Runs resolved statements by compiling them to closures first. Drop-in replacement for Interpreter in Lox.
+    def __init__(self):
+        self.globals = GlobalEnvironment()
+        self.globals.define('clock', Clock())
+        self.compiler = ClosureCompiler(self.globals)
+
+    def interpret(self, statements):
+        result = None
+        try:
+            for statement in statements:
+                result = self.compiler.compile(statement)(self.globals)
+        except LoxRuntimeError as ex:
+            Errors.error(ex.message, ex.token)
+        return result
@@ -10,13 +10,20 @@ class LoxRuntimeError(Exception):
     message: str
 
 
+UNDEFINED = object()
+
+
 class Environment:
-    def __init__(self, enclosing):
-        self.values = {}
-        self.enclosing = enclosing
+    # The frame of a block or function body: one slot per local, numbered by the Resolver, so a variable access is a
+    # hop along `enclosing` for each scope in between and a list index. Blocks run in their enclosing frame are counted
+    # only when `counting` is set, by --stats, as the count would cost about as much as the frame it saves.
+    __slots__ = ('values', 'enclosing')
+    counting = False
+    elided = 0
 
-    def define(self, name, value):
-        self.values[name] = value
+    def __init__(self, enclosing, size=0):
+        self.values = [None] * size
+        self.enclosing = enclosing
 
     def ancestor(self, distance):
         environment = self
@@ -24,23 +31,50 @@ class Environment:
             environment = environment.enclosing
         return environment
 
-    def getAt(self, distance, name):
-        return self.ancestor(distance).values.get(name)
+    def getAt(self, distance, slot):
+        return self.ancestor(distance).values[slot]
+
+    def assignAt(self, distance, slot, value):
+        self.ancestor(distance).values[slot] = value
+
+    @staticmethod
+    def stats():
+        return {'elided': Environment.elided}
 
-    def assignAt(self, distance, name: Token, value):
-        self.ancestor(distance).values[name.lexeme] = value
+
+class GlobalEnvironment:
+    # Globals can't be numbered up front, since a function may refer to one that is only declared further down.
+    # Instead each name gets an index the first time it is seen, and stays UNDEFINED until declared. A node reading a
+    # global caches the index together with the table's `stamp`, so a later read is a list index too.
+    def __init__(self):
+        self.indices = {}
+        self.values = []
+        self.stamp = object()
+        self.enclosing = None
+
+    def index(self, name):
+        index = self.indices.get(name)
+        if index is None:
+            index = self.indices[name] = len(self.values)
+            self.values.append(UNDEFINED)
+        return index
+
+    def define(self, name, value):
+        self.values[self.index(name)] = value
 
     def get(self, name: Token):
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
-        if self.enclosing:
-            return self.enclosing.get(name)
-        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        return self.getAt(self.index(name.lexeme), name)
+
+    def getAt(self, index, name: Token):
+        value = self.values[index]
+        if value is UNDEFINED:
+            raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        return value
 
     def assign(self, name: Token, value):
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-        elif self.enclosing:
-            self.enclosing.assign(name, value)
-        else:
+        self.assignAt(self.index(name.lexeme), name, value)
+
+    def assignAt(self, index, name: Token, value):
+        if self.values[index] is UNDEFINED:
             raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        self.values[index] = value
@@ -1,80 +1,141 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from tokens import Token
+from tokens import Token, TokenType
 
 
 class Expr:
+    # Variable, Assign, This and Super carry a `depth` and a `slot`, as found by the Resolver: the number of scopes
+    # between the expression and the frame holding its variable, and the variable's index in that frame. A depth of
+    # None means the variable is global; Variable and Assign then cache the variable's index in the global table as
+    # their slot, valid while their `stamp` matches the table's.
+    # Get, Set and Super carry the `cache` the Interpreter keeps of what their name means on each shape or class it met
+    # there. A NumberBinary carries the `function` computing its operator, so running it needs no table lookup.
+    # Nodes are slotted and operators are stored as their TokenType and the `line` they are on, the only parts of the
+    # token read after parsing. Large programs keep a lot of nodes alive, and a per-instance __dict__ is most of their
+    # size.
+    __slots__ = ()
+
     def accept(self, visitor):
         return getattr(visitor, f'visit{type(self).__name__}Expr')(self)
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Assign(Expr):
     name: Token
     value: Expr
+    depth: int = field(default=None, compare=False)
+    slot: int = field(default=None, compare=False)
+    stamp: object = field(default=None, compare=False, repr=False)
+
+
+@dataclass(slots=True)
+class UpdateAssign(Assign):
+    # `i = i <operator> x` as one node, found by Lowering: the variable is read without visiting the Variable and the
+    # Binary. Like NumberBinary, it keeps its base class's layout and children, so other passes can treat it as one.
+    pass
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Binary(Expr):
     left: 'Expr'
-    operator: Token
+    operator: TokenType
     right: 'Expr'
+    line: int = field(default=0, compare=False)
+    function: object = field(default=None, compare=False, repr=False)
+
+
+@dataclass(slots=True)
+class NumberBinary(Binary):
+    # A Binary that TypeInference expects to only see numbers, and a `+` it expects to only see strings. They share
+    # Binary's layout, so TypeInference rewrites them in place.
+    pass
+
 
+@dataclass(slots=True)
+class StringConcat(Binary):
+    pass
 
-@dataclass(unsafe_hash=True)
+
+@dataclass(slots=True)
 class Call(Expr):
     callee: Expr
     paren: Token
     arguments: list
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
+class Invoke(Call):
+    # `object.name(arguments)`, found by the Resolver: the method is called with the object as its `this` without
+    # binding it first. The callee stays a Get, so other passes can treat it as a Call.
+    pass
+
+
+@dataclass(slots=True)
 class Get(Expr):
     object: Expr
     name: Token
+    cache: dict = field(default=None, compare=False, repr=False)
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Grouping(Expr):
     expression: Expr
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Literal(Expr):
     value: object
 
 
-@dataclass
+@dataclass(slots=True)
 class Logical(Expr):
     left: Expr
-    operator: Token
+    operator: TokenType
     right: Expr
+    line: int = field(default=0, compare=False)
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Set(Expr):
     object: Expr
     name: Token
     value: Expr
+    cache: dict = field(default=None, compare=False, repr=False)
+
+
+@dataclass(slots=True)
+class UpdateSet(Set):
+    # `x.f = x.f <operator> y` as one node, found by Lowering. The object is evaluated once, and the field read, the
+    # operation and the store happen without visiting the Get and the Binary.
+    pass
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Super(Expr):
     keyword: Token
     method: Token
+    depth: int = field(default=None, compare=False)
+    slot: int = field(default=None, compare=False)
+    cache: dict = field(default=None, compare=False, repr=False)
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class This(Expr):
     keyword: Token
+    depth: int = field(default=None, compare=False)
+    slot: int = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Unary(Expr):
-    operator: Token
+    operator: TokenType
     right: 'Expr'
+    line: int = field(default=0, compare=False)
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(slots=True)
 class Variable(Expr):
     name: Token
+    depth: int = field(default=None, compare=False)
+    slot: int = field(default=None, compare=False)
+    stamp: object = field(default=None, compare=False, repr=False)
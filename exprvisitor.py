@@ -1,6 +1,9 @@
 import abc
 
-from expressions import Binary, Grouping, Literal, Unary, Assign, Call, Logical, Variable, Get, Set, This, Super
+from expressions import (
+    Binary, Grouping, Literal, Unary, Assign, Call, Logical, Variable, Get, Set, This, Super, NumberBinary, StringConcat,
+    UpdateAssign, UpdateSet, Invoke,
+)
 
 
 class ExprVisitor(abc.ABC):
@@ -51,3 +54,20 @@ class ExprVisitor(abc.ABC):
     @abc.abstractmethod
     def visitVariableExpr(self, expr: Variable):
         pass
+
+    # Specialized forms of Binary; visitors that don't care about the difference treat them as a Binary.
+    def visitNumberBinaryExpr(self, expr: NumberBinary):
+        return self.visitBinaryExpr(expr)
+
+    def visitStringConcatExpr(self, expr: StringConcat):
+        return self.visitBinaryExpr(expr)
+
+    # Superinstructions; visitors without a faster way to run them see the nodes they were made from.
+    def visitUpdateAssignExpr(self, expr: UpdateAssign):
+        return self.visitAssignExpr(expr)
+
+    def visitUpdateSetExpr(self, expr: UpdateSet):
+        return self.visitSetExpr(expr)
+
+    def visitInvokeExpr(self, expr: Invoke):
+        return self.visitCallExpr(expr)
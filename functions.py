@@ -1,16 +1,28 @@
 import datetime
-from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Any
 
-from classes import LoxInstance, INIT_METHOD_NAME
+from classes import LoxInstance
 from environment import Environment
+from memo import Memo
 from statements import Function
 
 
-@dataclass
-class ReturnException(Exception):
-    value: Any
+class Returning:
+    # What executing a statement gives back when a return statement ran inside it, instead of raising: blocks, ifs and
+    # loops stop and pass it on until it reaches the function call, which takes the value from it. There is only one,
+    # as nothing else runs between the return and the call picking its value up. A tail call leaves the `function` to
+    # call, its `arguments` and, for a method, its `this` instead of a value, for the call to run in place of its own
+    # function.
+    __slots__ = ('value', 'function', 'arguments', 'this')
+
+    def __init__(self):
+        self.value = None
+        self.function = None
+        self.arguments = None
+        self.this = None
+
+
+RETURNING = Returning()
 
 
 class FunctionType(Enum):
@@ -21,29 +33,45 @@ class FunctionType(Enum):
 
 
 class LoxFunction:
-    def __init__(self, declaration: Function, closure: Environment, isInitializer):
+    # A method's frame holds `this` in slot 0, ahead of its parameters. Calls through `object.method()` hand the object
+    # to `invoke` directly; only a method used as a value is bound, into a LoxFunction carrying its `this`.
+    def __init__(self, declaration: Function, closure: Environment, isInitializer, isMethod=False, this=None):
         self.isInitializer = isInitializer
+        self.isMethod = isMethod or isInitializer
         self.closure = closure
         self.declaration = declaration
+        self.this = this
+        self.memo = Memo(declaration) if declaration.pure else None
 
     def bind(self, instance: LoxInstance):
-        environment = Environment(self.closure)
-        environment.define('this', instance)
-        return LoxFunction(self.declaration, environment, self.isInitializer)
+        return LoxFunction(self.declaration, self.closure, self.isInitializer, self.isMethod, instance)
 
     def arity(self):
         return len(self.declaration.params)
 
     def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
-        for param, argument in zip(self.declaration.params, arguments):
-            environment.define(param.lexeme, argument)
-        try:
-            interpreter.executeBlock(self.declaration.body, environment)
-        except ReturnException as returnValue:
-            return self.closure.getAt(0, INIT_METHOD_NAME) if self.isInitializer else returnValue.value
-        if self.isInitializer:
-            return self.closure.getAt(0, INIT_METHOD_NAME)
+        if self.memo is not None:
+            return self.memo.call(self, interpreter, arguments)
+        return self.invoke(interpreter, self.this, arguments)
+
+    def invoke(self, interpreter, this, arguments):
+        function = self
+        while True:
+            environment = Environment(function.closure, function.declaration.size)
+            if function.isMethod:
+                environment.values[0] = this
+                environment.values[1:len(arguments) + 1] = arguments
+            else:
+                environment.values[:len(arguments)] = arguments
+            completion = interpreter.executeBlock(function.declaration.body, environment)
+            if function.isInitializer:
+                return this
+            if completion is not RETURNING:
+                return None
+            if RETURNING.function is None:
+                return RETURNING.value
+            function, arguments, this = RETURNING.function, RETURNING.arguments, RETURNING.this
+            RETURNING.function = None
 
 
 class Clock:
@@ -0,0 +1,147 @@
+from dataclasses import fields
+
+from expressions import Expr, Binary, Logical, Unary
+from parser import PrattParser
+from resolver import Resolver
+from scanner import Scanner
+from statements import Stmt
+from util import Errors
+
+
+def shiftOperatorLines(nodes, delta):
+    # Operator nodes keep their operator's line without its token, so they are moved along with the tokens here. A
+    # node reachable twice is moved once.
+    seen = set()
+    while nodes:
+        value = nodes.pop()
+        if isinstance(value, list):
+            nodes.extend(value)
+        elif isinstance(value, (Expr, Stmt)) and id(value) not in seen:
+            seen.add(id(value))
+            if isinstance(value, (Binary, Logical, Unary)):
+                value.line += delta
+            nodes.extend(getattr(value, field.name) for field in fields(value))
+
+
+class Chunk:
+    # A run of whole source lines holding one or more top-level declarations, with everything the front end derived
+    # from it. Chunks partition the buffer, so an unchanged chunk can be reused wherever it moved to.
+    def __init__(self, text, startLine, tokens, statements):
+        self.text = text
+        self.startLine = startLine
+        self.tokens = tokens
+        self.statements = statements
+
+    def moveTo(self, startLine):
+        delta = startLine - self.startLine
+        if delta:
+            for token in self.tokens:
+                token.line += delta
+            shiftOperatorLines(list(self.statements), delta)
+            self.startLine = startLine
+
+
+class IncrementalFrontEnd:
+    # Scans, parses and resolves a whole buffer that is resubmitted after every edit. Chunks matching the start and
+    # the end of the previous buffer are reused, so only the edited lines go through the front end again. Top-level
+    # declarations resolve independently of each other, which makes reusing their resolved depths safe.
+    def __init__(self, parserClass=PrattParser):
+        self.parserClass = parserClass
+        self.chunks = []
+        self.reused = 0
+        self.rebuilt = 0
+
+    def update(self, source):
+        old = self.chunks
+        start, first = 0, 0
+        while first < len(old) and old[first].text.endswith('\n') and source.startswith(old[first].text, start):
+            start += len(old[first].text)
+            first += 1
+        # The last matching chunk is rebuilt anyway: an edit right after it (say, adding an `else`) may extend it.
+        if first:
+            first -= 1
+            start -= len(old[first].text)
+
+        end, last = len(source), len(old)
+        while last > first:
+            text = old[last - 1].text
+            begin = end - len(text)
+            if begin < start or not source.endswith(text, start, end) or (begin > start and source[begin - 1] != '\n'):
+                break
+            end = begin
+            last -= 1
+
+        if first or last < len(old):
+            Errors.muted = True
+            try:
+                middle = self.build(source, start, end, source.count('\n', 0, start) + 1)
+            finally:
+                Errors.muted = False
+            if middle is None:
+                Errors.hadError = False
+                first, last = 0, len(old)
+                start, end = 0, len(source)
+        if not first and last == len(old):
+            middle = self.build(source, start, end, 1)
+
+        if middle is None:
+            self.chunks = []
+            return None
+
+        line = middle[-1].startLine + middle[-1].text.count('\n') if middle else source.count('\n', 0, start) + 1
+        for chunk in old[last:]:
+            chunk.moveTo(line)
+            line += chunk.text.count('\n')
+
+        self.chunks = old[:first] + middle + old[last:]
+        self.reused += len(old) - (last - first)
+        self.rebuilt += len(middle)
+        return [statement for chunk in self.chunks for statement in chunk.statements]
+
+    def build(self, source, start, end, line):
+        text = source[start:end]
+        scanner = Scanner(text)
+        scanner.line = line
+        # The parser and the chunks need the tokens themselves, shared with the AST, so they are kept as a list,
+        # along with where each starts and ends in the text.
+        tokens, starts, ends = [], [], []
+        for token in scanner.iterTokens():
+            tokens.append(token)
+            starts.append(scanner.start)
+            ends.append(scanner.current)
+        parser = self.parserClass(tokens)
+
+        chunks = []
+        chunkStart, chunkFirst, chunkLine, previousEnd = 0, 0, line, 0
+        while not parser.isAtEnd():
+            firstToken = parser.current
+            statement = parser.declaration()
+            declarationStart = starts[firstToken]
+            newline = text.rfind('\n', previousEnd, declarationStart)
+            if chunks and newline != -1:
+                chunks[-1].text = text[chunkStart:newline + 1]
+                chunks[-1].tokens = tokens[chunkFirst:firstToken]
+                chunkLine += text.count('\n', chunkStart, newline + 1)
+                chunkStart, chunkFirst = newline + 1, firstToken
+            if not chunks or chunkFirst == firstToken:
+                chunks.append(Chunk(None, chunkLine, None, []))
+            chunks[-1].statements.append(statement)
+            lastToken = parser.current - 1
+            previousEnd = ends[lastToken]
+
+        if Errors.hadError:
+            return None
+        if not chunks and text:
+            chunks.append(Chunk(None, line, None, []))
+        if chunks:
+            chunks[-1].text = text[chunkStart:]
+            chunks[-1].tokens = tokens[chunkFirst:-1]
+
+        for chunk in chunks:
+            Resolver().resolveStatements(chunk.statements)
+        if Errors.hadError:
+            return None
+        return chunks
+
+    def stats(self):
+        return {'chunks': len(self.chunks), 'reused': self.reused, 'rebuilt': self.rebuilt}
@@ -0,0 +1,32 @@
+# How many shapes or classes one site remembers. A site that meets more is megamorphic: each new one replaces the one
+# it met first. Shapes and classes that are gone, like those of an earlier run of a chunk runBuffer reuses, so age out
+# instead of holding the site's slots and keeping their objects alive.
+LIMIT = 4
+
+
+class InlineCache:
+    # Each Get node keeps a dict from the shapes it has met to what its name means on them: a method, the index of a
+    # field, or None when it is neither. Set nodes keep the field's index, or the shape adding the field moves an
+    # instance to, and Super nodes the method found on each superclass. Methods are fixed when a class is created and
+    # a shape's fields never change, so an entry stays valid as long as its key exists. A hit is one subscript of the
+    # dict; a site that has no dict yet, or no entry, raises and fills it. Counting hits costs about as much as the
+    # hit itself, so it happens only when `counting` is set, by --stats.
+    counting = False
+    hits = 0
+    misses = 0
+    megamorphic = 0
+
+    @staticmethod
+    def fill(site, key, entry):
+        InlineCache.misses += 1
+        if site.cache is None:
+            site.cache = {}
+        elif len(site.cache) >= LIMIT:
+            InlineCache.megamorphic += 1
+            del site.cache[next(iter(site.cache))]
+        site.cache[key] = entry
+        return entry
+
+    @staticmethod
+    def stats():
+        return {'hits': InlineCache.hits, 'misses': InlineCache.misses, 'megamorphic': InlineCache.megamorphic}
@@ -1,8 +1,14 @@
 from classes import LoxClass, LoxInstance, INIT_METHOD_NAME
-from environment import Environment, LoxRuntimeError
-from expressions import Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Expr, Get, Set, This, Super
-from functions import Clock, LoxFunction, ReturnException
-from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from environment import Environment, GlobalEnvironment, LoxRuntimeError, UNDEFINED
+from expressions import (
+    Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Expr, Get, Set, This, Super, NumberBinary,
+    StringConcat, UpdateAssign, UpdateSet, Invoke,
+)
+from functions import Clock, LoxFunction, RETURNING
+from inlinecache import InlineCache
+from operators import BINARY_OPERATORS, UNARY_OPERATORS
+from shapes import Shape
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class, CompareWhile
 from stmtvisitor import StmtVisitor
 from tokens import TokenType, Token
 from exprvisitor import ExprVisitor
@@ -11,9 +17,8 @@ from util import Errors
 
 class Interpreter(ExprVisitor, StmtVisitor):
     def __init__(self):
-        self.globals = Environment(None)
+        self.globals = GlobalEnvironment()
         self.environment = self.globals
-        self.locals = {}
 
         self.globals.define('clock', Clock())
 
@@ -37,49 +42,46 @@ class Interpreter(ExprVisitor, StmtVisitor):
         try:
             self.environment = environment
             for statement in statements:
-                self.execute(statement)
+                if self.execute(statement) is RETURNING:
+                    return RETURNING
         finally:
             self.environment = previous
 
-    def resolve(self, expr: Expr, depth):
-        self.locals[expr] = depth
-
     # Implement ExprVisitor
     def visitAssignExpr(self, expr: Assign):
-        value = self.evaluate(expr.value)
-        distance = self.locals.get(expr)
+        return self.assign(expr, self.evaluate(expr.value))
+
+    def visitUpdateAssignExpr(self, expr: UpdateAssign):
+        binary = expr.value
+        variable = binary.left
+        value = BINARY_OPERATORS[binary.operator](
+            self.lookupVariable(variable.name, variable), self.evaluate(binary.right),
+        )
+        return self.assign(expr, value)
+
+    def assign(self, expr: Assign, value):
+        distance = expr.depth
         if distance is not None:
-            self.environment.assignAt(distance, expr.name, value)
+            self.environment.assignAt(distance, expr.slot, value)
         else:
-            self.globals.assign(expr.name, value)
+            self.globals.assignAt(self.globalIndex(expr), expr.name, value)
         return value
 
     def visitBinaryExpr(self, expr: Binary):
-        left = self.evaluate(expr.left)
-        right = self.evaluate(expr.right)
-
-        if expr.operator.type == TokenType.MINUS:
-            return left - right
-        if expr.operator.type == TokenType.PLUS:
-            return left + right
-        if expr.operator.type == TokenType.SLASH:
-            return left / right
-        if expr.operator.type == TokenType.STAR:
-            return left + right
-        if expr.operator.type == TokenType.GREATER:
-            return left > right
-        if expr.operator.type == TokenType.GREATER_EQUAL:
-            return left >= right
-        if expr.operator.type == TokenType.LESS:
-            return left < right
-        if expr.operator.type == TokenType.LESS_EQUAL:
-            return left <= right
-        if expr.operator.type == TokenType.EQUAL_EQUAL:
-            return left == right
+        return BINARY_OPERATORS[expr.operator](self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visitNumberBinaryExpr(self, expr: NumberBinary):
+        return expr.function(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visitStringConcatExpr(self, expr: StringConcat):
+        return self.evaluate(expr.left) + self.evaluate(expr.right)
 
     def visitCallExpr(self, expr: Call):
         callee = self.evaluate(expr.callee)
         arguments = [self.evaluate(argument) for argument in expr.arguments]
+        return self.call(callee, arguments)
+
+    def call(self, callee, arguments):
         try:
             if len(arguments) != callee.arity():
                 raise Exception(f'Expected {callee.arity()} arguments but got {len(arguments)}.')
@@ -87,12 +89,73 @@ class Interpreter(ExprVisitor, StmtVisitor):
         except AttributeError:
             raise Exception('Can only call functions and classes.')
 
+    def visitInvokeExpr(self, expr: Invoke):
+        # A method found on the object runs with the object as its `this`, without being bound; a field holding a
+        # function is called like any other value.
+        get = expr.callee
+        obj = self.evaluate(get.object)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(get.name, 'Only instances may have properties.')
+        entry = self.lookup(get, obj.shape)
+        if type(entry) is int:
+            return self.call(obj.values[entry], [self.evaluate(argument) for argument in expr.arguments])
+        if entry is None:
+            raise LoxRuntimeError(get.name, f"Undefined property '{get.name.lexeme}'")
+        arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if len(arguments) != entry.arity():
+            raise Exception(f'Expected {entry.arity()} arguments but got {len(arguments)}.')
+        return entry.invoke(self, obj, arguments)
+
     def visitGetExpr(self, expr: Get):
         obj = self.evaluate(expr.object)
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            return self.getProperty(obj, expr)
         raise LoxRuntimeError(expr.name, 'Only instances may have properties.')
 
+    def getProperty(self, instance: LoxInstance, expr: Get):
+        # LoxInstance.get, with what the name means on the instance's shape answered by the expression's inline cache.
+        shape = instance.shape
+        try:
+            entry = expr.cache[shape]
+        except (KeyError, TypeError):
+            entry = InlineCache.fill(expr, shape, shape.lookup(expr.name.lexeme))
+        else:
+            if InlineCache.counting:
+                InlineCache.hits += 1
+        if type(entry) is int:
+            return instance.values[entry]
+        if entry is None:
+            raise LoxRuntimeError(expr.name, f"Undefined property '{expr.name.lexeme}'")
+        return entry.bind(instance)
+
+    @staticmethod
+    def lookup(expr: Get, shape: Shape):
+        try:
+            entry = expr.cache[shape]
+        except (KeyError, TypeError):
+            return InlineCache.fill(expr, shape, shape.lookup(expr.name.lexeme))
+        if InlineCache.counting:
+            InlineCache.hits += 1
+        return entry
+
+    @staticmethod
+    def setProperty(instance: LoxInstance, expr: Set, value):
+        # LoxInstance.set, with where the value goes answered by the expression's inline cache: a field's index, or the
+        # shape the instance moves to by adding the field.
+        shape = instance.shape
+        try:
+            entry = expr.cache[shape]
+        except (KeyError, TypeError):
+            entry = InlineCache.fill(expr, shape, shape.store(expr.name.lexeme))
+        else:
+            if InlineCache.counting:
+                InlineCache.hits += 1
+        if type(entry) is int:
+            instance.values[entry] = value
+        else:
+            instance.shape = entry
+            instance.values.append(value)
+
     def visitGroupingExpr(self, expr: Grouping):
         return self.evaluate(expr.expression)
 
@@ -103,7 +166,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
         left = self.evaluate(expr.left)
 
         # Don't evaluate right if left side of OR is true or if left side of AND is false.
-        if expr.operator.type == TokenType.OR:
+        if expr.operator == TokenType.OR:
             if left:
                 return left
         else:
@@ -117,14 +180,29 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if not isinstance(obj, LoxInstance):
             raise LoxRuntimeError(expr.name, 'Only instances have fields.')
         value = self.evaluate(expr.value)
-        obj.set(expr.name, value)
+        self.setProperty(obj, expr, value)
+        return value
+
+    def visitUpdateSetExpr(self, expr: UpdateSet):
+        obj = self.evaluate(expr.object)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError(expr.name, 'Only instances have fields.')
+        binary = expr.value
+        value = BINARY_OPERATORS[binary.operator](self.getProperty(obj, binary.left), self.evaluate(binary.right))
+        self.setProperty(obj, expr, value)
         return value
 
     def visitSuperExpr(self,expr: Super):
-        distance = self.locals.get(expr)
-        superclass = self.environment.getAt(distance, 'super')
-        obj = self.environment.getAt(distance - 1, 'this')
-        method = superclass.findMethod(expr.method.lexeme)
+        distance = expr.depth
+        superclass = self.environment.getAt(distance, 0)
+        obj = self.environment.getAt(distance - 1, 0)
+        try:
+            method = expr.cache[superclass]
+        except (KeyError, TypeError):
+            method = InlineCache.fill(expr, superclass, superclass.findMethod(expr.method.lexeme))
+        else:
+            if InlineCache.counting:
+                InlineCache.hits += 1
         if not method:
             raise LoxRuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
         return method.bind(obj)
@@ -133,24 +211,43 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self.lookupVariable(expr.keyword, expr)
 
     def visitUnaryExpr(self, expr: Unary):
-        right = self.evaluate(expr.right)
-        if expr.operator.type == TokenType.MINUS:
-            return -float(right)
-        if expr.operator.type == TokenType.BANG:
-            return not right
+        return UNARY_OPERATORS[expr.operator](self.evaluate(expr.right))
 
     def visitVariableExpr(self, expr: Variable):
         return self.lookupVariable(expr.name, expr)
 
     def lookupVariable(self, name: Token, expr: Expr):
-        distance = self.locals.get(expr)
+        distance = expr.depth
         if distance is not None:
-            return self.environment.getAt(distance, name.lexeme)
-        return self.globals.get(name)
+            return self.environment.getAt(distance, expr.slot)
+        if expr.stamp is self.globals.stamp:
+            value = self.globals.values[expr.slot]
+            if value is not UNDEFINED:
+                return value
+        return self.globals.getAt(self.globalIndex(expr), name)
+
+    def globalIndex(self, expr):
+        if expr.stamp is not self.globals.stamp:
+            expr.slot = self.globals.index(expr.name.lexeme)
+            expr.stamp = self.globals.stamp
+        return expr.slot
+
+    def define(self, name: Token, slot, value):
+        if slot is None:
+            self.globals.define(name.lexeme, value)
+        else:
+            self.environment.values[slot] = value
 
     # Implement StmtVisitor
     def visitBlockStmt(self, stmt: Block):
-        self.executeBlock(stmt.statements, Environment(self.environment))
+        if stmt.size is None:
+            if Environment.counting:
+                Environment.elided += 1
+            for statement in stmt.statements:
+                if self.execute(statement) is RETURNING:
+                    return RETURNING
+        else:
+            return self.executeBlock(stmt.statements, Environment(self.environment, stmt.size))
 
     def visitClassStmt(self, stmt: Class):
         superclass = None
@@ -159,50 +256,83 @@ class Interpreter(ExprVisitor, StmtVisitor):
             superclass = self.evaluate(stmt.superclass)
             if not isinstance(superclass, LoxClass):
                 raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
-        self.environment.define(stmt.name.lexeme, None)
         if stmt.superclass:
-            self.environment = Environment(self.environment)
-            self.environment.define('super', superclass)
+            self.environment = Environment(self.environment, 1)
+            self.environment.values[0] = superclass
 
         methods = {}
         for method in stmt.methods:
-            function = LoxFunction(method, self.environment, method.name.lexeme == INIT_METHOD_NAME)
+            function = LoxFunction(method, self.environment, method.name.lexeme == INIT_METHOD_NAME, True)
             methods[method.name.lexeme] = function
         cls = LoxClass(stmt.name.lexeme, superclass, methods)
 
         if stmt.superclass:
             self.environment = self.environment.enclosing
 
-        self.environment.assign(stmt.name, cls)
+        self.define(stmt.name, stmt.slot, cls)
 
     def visitExpressionStmt(self, stmt: Expression):
         return self.evaluate(stmt.expression)  # Return evaluated expression for tests
 
     def visitFunctionStmt(self, stmt: Function):
         function = LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        self.define(stmt.name, stmt.slot, function)
 
     def visitIfStmt(self, stmt: If):
         if self.evaluate(stmt.condition):
-            self.execute(stmt.thenBranch)
-        elif stmt.elseBranch:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.thenBranch)
+        if stmt.elseBranch:
+            return self.execute(stmt.elseBranch)
 
     def visitPrintStmt(self, stmt: Print):
         value = self.evaluate(stmt.expression)
         print(value)
 
     def visitReturnStmt(self, stmt: Return):
-        value = stmt.value and self.evaluate(stmt.value)
-        e = ReturnException(value)
-        raise e
+        if stmt.tailCall:
+            # Leave the call to LoxFunction.invoke, which runs it without nesting another Python call.
+            call = stmt.value
+            this = None
+            if type(call) is Invoke:
+                get = call.callee
+                this = self.evaluate(get.object)
+                if not isinstance(this, LoxInstance):
+                    raise LoxRuntimeError(get.name, 'Only instances may have properties.')
+                callee = self.lookup(get, this.shape)
+                if type(callee) is int:
+                    callee = this.values[callee]
+                elif callee is None:
+                    raise LoxRuntimeError(get.name, f"Undefined property '{get.name.lexeme}'")
+            else:
+                callee = self.evaluate(call.callee)
+            arguments = [self.evaluate(argument) for argument in call.arguments]
+            if type(callee) is LoxFunction and len(arguments) == callee.arity():
+                RETURNING.function, RETURNING.arguments, RETURNING.this = callee, arguments, callee.this or this
+                return RETURNING
+            RETURNING.value = self.call(callee, arguments)
+            return RETURNING
+        RETURNING.value = stmt.value and self.evaluate(stmt.value)
+        return RETURNING
 
     def visitVarStmt(self, stmt: Var):
         value = None
         if stmt.initializer:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt.name, stmt.slot, value)
 
     def visitWhileStmt(self, stmt: While):
+        if stmt.condition is None:
+            while True:
+                if self.execute(stmt.body) is RETURNING:
+                    return RETURNING
         while self.evaluate(stmt.condition):
-            self.execute(stmt.body)
+            if self.execute(stmt.body) is RETURNING:
+                return RETURNING
+
+    def visitCompareWhileStmt(self, stmt: CompareWhile):
+        condition = stmt.condition
+        compare = BINARY_OPERATORS[condition.operator]
+        left, right = condition.left, condition.right
+        while compare(self.evaluate(left), self.evaluate(right)):
+            if self.execute(stmt.body) is RETURNING:
+                return RETURNING
@@ -0,0 +1,123 @@
+from expressions import (
+    Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Get, Set, This, Super, UpdateAssign, UpdateSet,
+)
+from exprvisitor import ExprVisitor
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class, CompareWhile
+from stmtvisitor import StmtVisitor
+
+
+def sameVariable(a, b):
+    # Two mentions of a name in one expression always resolve to the same variable: nothing in between can declare it.
+    if type(a) is This:
+        return type(b) is This
+    return type(a) is Variable and type(b) is Variable and a.name.lexeme == b.name.lexeme
+
+
+class Lowering(ExprVisitor, StmtVisitor):
+    # Turns common shapes of code into superinstructions, in place, by changing the class of the nodes at their root:
+    # `i = i + 1` becomes an UpdateAssign, `x.f = x.f + y` an UpdateSet and a loop on `a < b` a CompareWhile. It runs
+    # on resolved statements just before they are interpreted, and doing it twice changes nothing.
+    lowered = 0
+
+    def lowerStatements(self, statements):
+        for statement in statements:
+            self.lower(statement)
+        return statements
+
+    def lower(self, node):
+        node.accept(self)
+
+    @staticmethod
+    def stats():
+        return {'superinstructions': Lowering.lowered}
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        self.lower(expr.value)
+        value = expr.value
+        if type(expr) is Assign and isinstance(value, Binary) and type(value.left) is Variable:
+            if value.left.name.lexeme == expr.name.lexeme:
+                expr.__class__ = UpdateAssign
+                Lowering.lowered += 1
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.lower(expr.left)
+        self.lower(expr.right)
+
+    def visitCallExpr(self, expr: Call):
+        self.lower(expr.callee)
+        for argument in expr.arguments:
+            self.lower(argument)
+
+    def visitGetExpr(self, expr: Get):
+        self.lower(expr.object)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.lower(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.lower(expr.left)
+        self.lower(expr.right)
+
+    def visitSetExpr(self, expr: Set):
+        self.lower(expr.object)
+        self.lower(expr.value)
+        value = expr.value
+        if type(expr) is Set and isinstance(value, Binary) and type(value.left) is Get:
+            if value.left.name.lexeme == expr.name.lexeme and sameVariable(expr.object, value.left.object):
+                expr.__class__ = UpdateSet
+                Lowering.lowered += 1
+
+    def visitSuperExpr(self, expr: Super):
+        pass
+
+    def visitThisExpr(self, expr: This):
+        pass
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.lower(expr.right)
+
+    def visitVariableExpr(self, expr: Variable):
+        pass
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        self.lowerStatements(stmt.statements)
+
+    def visitClassStmt(self, stmt: Class):
+        for method in stmt.methods:
+            self.lower(method)
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.lower(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.lowerStatements(stmt.body)
+
+    def visitIfStmt(self, stmt: If):
+        self.lower(stmt.condition)
+        self.lower(stmt.thenBranch)
+        if stmt.elseBranch:
+            self.lower(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.lower(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            self.lower(stmt.value)
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            self.lower(stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While):
+        if stmt.condition is not None:
+            self.lower(stmt.condition)
+        self.lower(stmt.body)
+        if type(stmt) is While and isinstance(stmt.condition, Binary):
+            stmt.__class__ = CompareWhile
+            Lowering.lowered += 1
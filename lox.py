@@ -1,26 +1,99 @@
+import argparse
 import sys
 
+from astcache import AstCache
 from astprinter import AstPrinter
+from closurecompiler import ClosureInterpreter
+from environment import Environment
+from inlinecache import InlineCache
+from incremental import IncrementalFrontEnd
 from interpreter import Interpreter
-from parser import Parser
+from lowering import Lowering
+from memo import Memo
+from memstats import reportAstMemory
+from optimizer import Optimizer
+from typeinference import TypeInference
+from vm import VM
+from parser import Parser, PrattParser
+from purity import Purity
 from resolver import Resolver
-from scanner import Scanner
-from util import Errors
+from scanner import Scanner, openSource
+from shapes import Shape
+from transpiler import Transpiler
+from util import Errors, Stats
+
+Stats.register('ast cache', AstCache.stats)
+Stats.register('environments', Environment.stats)
+Stats.register('optimizer', Optimizer.stats)
+Stats.register('type inference', TypeInference.stats)
+Stats.register('lowering', Lowering.stats)
+Stats.register('inline caches', InlineCache.stats)
+Stats.register('shapes', Shape.stats)
+Stats.register('memoization', Memo.stats)
+
+
+PARSERS = {
+    'pratt': PrattParser,
+    'descent': Parser,
+}
+
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'vm': VM,
+}
 
 
 class Lox:
     interpreter = Interpreter()
+    parserClass = PrattParser
+    frontEnd = None
+    useCache = True
+    memStats = False
+    optimize = 0
+    compilePath = None
+    memoize = False
+    purity = None
 
     def main(self, args):
-        if len(args) > 2:
-            print('Usage: pylox [script]')
-            sys.exit(64)
-        elif len(args) == 2:
-            self.runFile(args[1])
-            pass
+        argParser = argparse.ArgumentParser(prog='pylox')
+        argParser.add_argument('script', nargs='?')
+        argParser.add_argument('--stats', action='store_true', help='print interpreter counters to stderr on exit')
+        argParser.add_argument('--parser', choices=PARSERS, default='pratt', help='expression parser to use')
+        argParser.add_argument('--no-cache', action='store_true', help="don't read or write the compiled AST cache")
+        argParser.add_argument('--engine', choices=ENGINES, default='tree', help='execution backend to use')
+        argParser.add_argument('--mem-stats', action='store_true', help='print AST memory per node type to stderr')
+        argParser.add_argument(
+            '-O', dest='optimize', action='count', default=0,
+            help='optimize the AST before running it; -OO also specializes operators by type',
+        )
+        argParser.add_argument(
+            '--compile', metavar='OUT', help='write the program to OUT as a Python module instead of running it',
+        )
+        argParser.add_argument(
+            '--memoize', action='store_true', help='cache the results of functions proven pure and report hit rates',
+        )
+        options = argParser.parse_args(args[1:])
+        self.interpreter = ENGINES[options.engine]()
+        self.parserClass = PARSERS[options.parser]
+        self.useCache = not options.no_cache
+        self.memStats = options.mem_stats
+        self.optimize = options.optimize
+        self.compilePath = options.compile
+        self.memoize = options.memoize
+        InlineCache.counting = options.stats
+        Environment.counting = options.stats
+
+        if options.script:
+            self.runFile(options.script)
         else:
             self.runPrompt()
 
+        if options.stats:
+            Stats.report()
+        elif options.memoize:
+            Stats.report(['memoization'])
+
     def runPrompt(self):
         print('Welcome to lox')
         while True:
@@ -35,25 +108,68 @@ class Lox:
                 break
 
     def runFile(self, path):
-        with open(path, 'r') as sourceFile:
-            self.run(sourceFile.read())
+        with openSource(path) as source:
+            return self.run(source, AstCache(path, source) if self.useCache else None)
+
+    def run(self, source, cache=None):
+        statements = cache and cache.load()
+        if statements is None:
+            statements = self.analyze(source)
+            if statements is None:
+                return
+            if cache:
+                cache.store(statements)
+        if self.memStats:
+            reportAstMemory(statements)
 
-    def run(self, source):
+        return self.interpret(statements)
+
+    def interpret(self, statements):
+        if self.optimize:
+            statements = Optimizer().optimizeProgram(statements)
+        if self.optimize > 1:
+            TypeInference().inferProgram(statements)
+        if self.memoize:
+            if self.purity is None:
+                self.purity = Purity()
+            self.purity.analyzeProgram(statements)
+        Lowering().lowerStatements(statements)
+        if self.compilePath:
+            with open(self.compilePath, 'w') as module:
+                module.write(Transpiler().transpile(statements))
+            return None
+        return self.interpreter.interpret(statements)
+
+    def analyze(self, source):
         scanner = Scanner(source)
-        tokens = scanner.scanTokens()
-        parser = Parser(tokens)
+        parser = self.parserClass(scanner.iterTokens())
         statements = parser.parse()
 
         if Errors.hadError:
-            return
+            return None
+
+        Resolver().resolveStatements(statements)
+
+        if Errors.hadError:
+            return None
+
+        return statements
 
-        Resolver(self.interpreter).resolveStatements(statements)
+    def runBuffer(self, source):
+        # For tools that resubmit a whole edited buffer: only the declarations that changed since the last call are
+        # scanned, parsed and resolved again.
+        if self.frontEnd is None:
+            self.frontEnd = IncrementalFrontEnd(self.parserClass)
+            Stats.register('incremental', self.frontEnd.stats)
+        Errors.hadError = False
+        statements = self.frontEnd.update(source)
+        # The whole buffer runs again and declares every function afresh, so Purity starts over on it.
+        self.purity = None
 
         if Errors.hadError:
             return
 
-        result = self.interpreter.interpret(statements)
-        return result
+        return self.interpret(statements)
 
 
 if __name__ == '__main__':
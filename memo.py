@@ -0,0 +1,55 @@
+import math
+from collections import OrderedDict
+
+# How many results one function keeps. Past that, the one used least recently makes room.
+LIMIT = 1024
+
+
+def memoizable(arguments):
+    # Only numbers, strings and nil, which can't change and compare equal only when Lox would treat them the same. -0
+    # equals 0 as a key but can give another result, and true would equal 1.
+    for argument in arguments:
+        kind = type(argument)
+        if kind is float:
+            if argument == 0 and math.copysign(1, argument) < 0:
+                return False
+        elif kind is not str and argument is not None:
+            return False
+    return True
+
+
+class Memo:
+    # The results of one pure function by its arguments, for functions Purity proved depend on nothing else. A call
+    # that fails stores nothing. Purity clears the declaration's `pure` once a later line at the prompt assigns or
+    # redeclares a global the function depends on, and from then on every call runs the function.
+    __slots__ = ('declaration', 'results')
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, declaration):
+        self.declaration = declaration
+        self.results = OrderedDict()
+
+    def call(self, function, interpreter, arguments):
+        if not self.declaration.pure or not memoizable(arguments):
+            return function.invoke(interpreter, None, arguments)
+        key = tuple(arguments)
+        results = self.results
+        if key in results:
+            Memo.hits += 1
+            results.move_to_end(key)
+            return results[key]
+        Memo.misses += 1
+        value = function.invoke(interpreter, None, arguments)
+        results[key] = value
+        if len(results) > LIMIT:
+            results.popitem(last=False)
+            Memo.evictions += 1
+        return value
+
+    @staticmethod
+    def stats():
+        calls = Memo.hits + Memo.misses
+        hitRate = f'{Memo.hits / calls:.1%}' if calls else 'n/a'
+        return {'hits': Memo.hits, 'misses': Memo.misses, 'evictions': Memo.evictions, 'hit rate': hitRate}
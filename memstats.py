@@ -0,0 +1,47 @@
+import sys
+from dataclasses import fields
+
+from expressions import Expr
+from statements import Stmt
+from tokens import Token
+from util import Errors
+
+
+def astMemory(statements):
+    # Bytes retained by the AST, per node type. Lists of arguments, parameters or statements count towards the node
+    # owning them. Tokens are shared between nodes, so each one is counted once, under its own heading. Strings and
+    # numbers are left out: identifiers are interned and mostly shared with the scanner and the environments.
+    usage = {}
+    seen = set()
+
+    def add(name, size):
+        count, total = usage.get(name, (0, 0))
+        usage[name] = count + 1, total + size
+
+    def visit(value, owner):
+        if isinstance(value, (Expr, Stmt)):
+            name = type(value).__name__
+            add(name, sys.getsizeof(value))
+            for field in fields(value):
+                visit(getattr(value, field.name), name)
+        elif isinstance(value, list):
+            count, total = usage[owner]
+            usage[owner] = count, total + sys.getsizeof(value)
+            for item in value:
+                visit(item, owner)
+        elif isinstance(value, Token) and id(value) not in seen:
+            seen.add(id(value))
+            add('Token', sys.getsizeof(value))
+
+    for statement in statements:
+        visit(statement, None)
+    return usage
+
+
+def reportAstMemory(statements):
+    usage = astMemory(statements)
+    for name, (count, total) in sorted(usage.items(), key=lambda item: -item[1][1]):
+        Errors.eprint(f'[ast memory] {name}: {count} objects, {total} bytes')
+    count = sum(count for count, total in usage.values())
+    total = sum(total for count, total in usage.values())
+    Errors.eprint(f'[ast memory] total: {count} objects, {total} bytes')
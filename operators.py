@@ -0,0 +1,23 @@
+import operator
+
+from tokens import TokenType
+
+# What each operator computes, so that evaluating one is a single call rather than a chain of comparisons. Lox values
+# are Python values and the operators are Python's, except that negation converts its operand to a number first.
+BINARY_OPERATORS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+}
+
+UNARY_OPERATORS = {
+    TokenType.MINUS: lambda value: -float(value),
+    TokenType.BANG: operator.not_,
+}
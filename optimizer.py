@@ -0,0 +1,162 @@
+from dataclasses import fields
+
+from expressions import Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Expr, Get, Set, This, Super
+from exprvisitor import ExprVisitor
+from interpreter import Interpreter
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class, Stmt
+from stmtvisitor import StmtVisitor
+from tokens import TokenType
+
+
+def countNodes(node):
+    if isinstance(node, list):
+        return sum(countNodes(item) for item in node)
+    if isinstance(node, (Expr, Stmt)):
+        return 1 + sum(countNodes(getattr(node, field.name)) for field in fields(node))
+    return 0
+
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    # Simplifies resolved statements in place. Each visit method returns the node to use instead of the one visited,
+    # or, for statements, None to drop it. Constant subtrees are folded by evaluating them with the interpreter
+    # itself, so a folded value is exactly what the program would have computed; a subtree that fails to evaluate is
+    # left alone, to fail at run time with its usual error.
+    removed = 0
+
+    def __init__(self):
+        self.interpreter = Interpreter()
+
+    def optimizeProgram(self, statements):
+        before = countNodes(statements)
+        statements = self.optimizeStatements(statements)
+        Optimizer.removed += before - countNodes(statements)
+        return statements
+
+    def optimizeStatements(self, statements):
+        optimized = []
+        for statement in statements:
+            statement = self.optimize(statement)
+            if statement is not None:
+                optimized.append(statement)
+                if isinstance(statement, Return):
+                    break
+        return optimized
+
+    def optimize(self, node):
+        return node.accept(self)
+
+    def fold(self, expr: Expr):
+        try:
+            return Literal(self.interpreter.evaluate(expr))
+        except Exception:
+            return expr
+
+    @staticmethod
+    def stats():
+        return {'nodes removed': Optimizer.removed}
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        expr.value = self.optimize(expr.value)
+        return expr
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left = self.optimize(expr.left)
+        expr.right = self.optimize(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            return self.fold(expr)
+        return expr
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee = self.optimize(expr.callee)
+        expr.arguments = [self.optimize(argument) for argument in expr.arguments]
+        return expr
+
+    def visitGetExpr(self, expr: Get):
+        expr.object = self.optimize(expr.object)
+        return expr
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.optimize(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        return expr
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left = self.optimize(expr.left)
+        expr.right = self.optimize(expr.right)
+        if not isinstance(expr.left, Literal):
+            return expr
+        # The interpreter returns the left operand when it decides the result, and the right one otherwise.
+        if bool(expr.left.value) == (expr.operator == TokenType.OR):
+            return expr.left
+        return expr.right
+
+    def visitSetExpr(self, expr: Set):
+        expr.object = self.optimize(expr.object)
+        expr.value = self.optimize(expr.value)
+        return expr
+
+    def visitSuperExpr(self, expr: Super):
+        return expr
+
+    def visitThisExpr(self, expr: This):
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right = self.optimize(expr.right)
+        if isinstance(expr.right, Literal):
+            return self.fold(expr)
+        return expr
+
+    def visitVariableExpr(self, expr: Variable):
+        return expr
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        stmt.statements = self.optimizeStatements(stmt.statements)
+        return stmt
+
+    def visitClassStmt(self, stmt: Class):
+        for method in stmt.methods:
+            self.optimize(method)
+        return stmt
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression = self.optimize(stmt.expression)
+        return stmt
+
+    def visitFunctionStmt(self, stmt: Function):
+        stmt.body = self.optimizeStatements(stmt.body)
+        return stmt
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition = self.optimize(stmt.condition)
+        stmt.thenBranch = self.optimize(stmt.thenBranch) or Block([])
+        stmt.elseBranch = stmt.elseBranch and self.optimize(stmt.elseBranch)
+        if isinstance(stmt.condition, Literal):
+            return stmt.thenBranch if stmt.condition.value else stmt.elseBranch
+        return stmt
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression = self.optimize(stmt.expression)
+        return stmt
+
+    def visitReturnStmt(self, stmt: Return):
+        stmt.value = stmt.value and self.optimize(stmt.value)
+        return stmt
+
+    def visitVarStmt(self, stmt: Var):
+        stmt.initializer = stmt.initializer and self.optimize(stmt.initializer)
+        return stmt
+
+    def visitWhileStmt(self, stmt: While):
+        # A condition of None means the loop only ends by returning.
+        if stmt.condition is not None:
+            stmt.condition = self.optimize(stmt.condition)
+        stmt.body = self.optimize(stmt.body) or Block([])
+        if isinstance(stmt.condition, Literal):
+            if not stmt.condition.value:
+                return None
+            stmt.condition = None
+        return stmt
@@ -11,8 +11,12 @@ class Parser:
         pass
 
     def __init__(self, tokens):
-        self.tokens = tokens
+        # Tokens are pulled one at a time, so `tokens` can be a lazy stream; only the current and previous token are
+        # kept alive.
+        self.tokens = iter(tokens)
         self.current = 0
+        self.currentToken = next(self.tokens)
+        self.previousToken = self.currentToken
 
     def parse(self):
         statements = []
@@ -44,7 +48,7 @@ class Parser:
             else self.expressionStatement()
         )
         condition = (
-            Literal(True) if self.match(TokenType.SEMICOLON)
+            Literal(True) if self.check(TokenType.SEMICOLON)
             else self.expression()
         )
         self.consume(TokenType.SEMICOLON, "Expect ';' after loop condition.")
@@ -145,7 +149,7 @@ class Parser:
         while self.match(TokenType.OR):
             operator = self.previous()
             right = self.andd()
-            expr = Logical(expr, operator, right)
+            expr = Logical(expr, operator.type, right, operator.line)
         return expr
 
     def andd(self):
@@ -153,7 +157,7 @@ class Parser:
         while self.match(TokenType.AND):
             operator = self.previous()
             right = self.equality()
-            expr = Logical(expr, operator, right)
+            expr = Logical(expr, operator.type, right, operator.line)
         return expr
 
     def expression(self):
@@ -192,7 +196,7 @@ class Parser:
         while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
             operator = self.previous()
             right = self.comparison()
-            expr = Binary(expr, operator, right)
+            expr = Binary(expr, operator.type, right, operator.line)
         return expr
 
     def comparison(self):
@@ -200,7 +204,7 @@ class Parser:
         while self.match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
             operator = self.previous()
             right = self.term()
-            expr = Binary(expr, operator, right)
+            expr = Binary(expr, operator.type, right, operator.line)
         return expr
 
     def term(self):
@@ -208,7 +212,7 @@ class Parser:
         while self.match(TokenType.MINUS, TokenType.PLUS):
             operator = self.previous()
             right = self.factor()
-            expr = Binary(expr, operator, right)
+            expr = Binary(expr, operator.type, right, operator.line)
         return expr
 
     def factor(self):
@@ -216,14 +220,14 @@ class Parser:
         while self.match(TokenType.SLASH, TokenType.STAR):
             operator = self.previous()
             right = self.unary()
-            expr = Binary(expr, operator, right)
+            expr = Binary(expr, operator.type, right, operator.line)
         return expr
 
     def unary(self):
         if self.match(TokenType.BANG, TokenType.MINUS):
             operator = self.previous()
             right = self.unary()
-            return Unary(operator, right)
+            return Unary(operator.type, right, operator.line)
         return self.call()
 
     def finishCall(self, callee: Expr):
@@ -289,16 +293,18 @@ class Parser:
     def advance(self):
         if not self.isAtEnd():
             self.current += 1
-        return self.previous()
+            self.previousToken = self.currentToken
+            self.currentToken = next(self.tokens)
+        return self.previousToken
 
     def isAtEnd(self):
         return self.peek().type == TokenType.EOF
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.currentToken
 
     def previous(self):
-        return self.tokens[self.current - 1]
+        return self.previousToken
 
     def consume(self, tokenType, message):
         if self.check(tokenType):
@@ -329,3 +335,83 @@ class Parser:
                 return
 
             self.advance()
+
+
+# Left binding power and node class of every infix operator, loosest first. Calls and property access bind tighter
+# than any of them and are parsed as part of the operand.
+BINDING_POWERS = {
+    TokenType.OR: (1, Logical),
+    TokenType.AND: (2, Logical),
+    TokenType.BANG_EQUAL: (3, Binary),
+    TokenType.EQUAL_EQUAL: (3, Binary),
+    TokenType.GREATER: (4, Binary),
+    TokenType.GREATER_EQUAL: (4, Binary),
+    TokenType.LESS: (4, Binary),
+    TokenType.LESS_EQUAL: (4, Binary),
+    TokenType.MINUS: (5, Binary),
+    TokenType.PLUS: (5, Binary),
+    TokenType.SLASH: (6, Binary),
+    TokenType.STAR: (6, Binary),
+}
+
+UNARY_OPERATORS = (TokenType.BANG, TokenType.MINUS)
+
+
+class PrattParser(Parser):
+    # Precedence climbing over BINDING_POWERS instead of one method per precedence level. Builds the same trees as
+    # Parser, but a leaf costs a couple of frames rather than ten.
+    def expression(self):
+        expr = self.infix(0)
+
+        if self.currentToken.type == TokenType.EQUAL:
+            equals = self.advance()
+            value = self.expression()
+
+            if isinstance(expr, Variable):
+                return Assign(expr.name, value)
+            elif isinstance(expr, Get):
+                return Set(expr.object, expr.name, value)
+
+            Errors.error("Invalid assignment target.", equals)
+
+        return expr
+
+    def infix(self, minPower):
+        left = self.unary()
+        while True:
+            binding = BINDING_POWERS.get(self.currentToken.type)
+            if binding is None or binding[0] <= minPower:
+                return left
+            power, node = binding
+            operator = self.advance()
+            left = node(left, operator.type, self.infix(power), operator.line)
+
+    def unary(self):
+        if self.currentToken.type in UNARY_OPERATORS:
+            operator = self.advance()
+            return Unary(operator.type, self.unary(), operator.line)
+        return self.call()
+
+    def call(self):
+        expr = self.primary()
+        while True:
+            tokenType = self.currentToken.type
+            if tokenType == TokenType.LEFT_PAREN:
+                self.advance()
+                expr = self.finishCall(expr)
+            elif tokenType == TokenType.DOT:
+                self.advance()
+                name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+                expr = Get(expr, name)
+            else:
+                return expr
+
+    def primary(self):
+        token = self.currentToken
+        if token.type == TokenType.IDENTIFIER:
+            self.advance()
+            return Variable(token)
+        if token.type == TokenType.NUMBER or token.type == TokenType.STRING:
+            self.advance()
+            return Literal(token.literal)
+        return super().primary()
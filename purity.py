@@ -0,0 +1,165 @@
+from collections import Counter
+
+from expressions import Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Get, Set, This, Super
+from exprvisitor import ExprVisitor
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from stmtvisitor import StmtVisitor
+
+
+class Facts:
+    # What one top-level function does beyond its own locals: the globals it reads and calls, and whether it does
+    # anything that can never be pure.
+    def __init__(self, function: Function):
+        self.function = function
+        self.reads = set()
+        self.calls = set()
+        self.impure = False
+
+
+class Purity(ExprVisitor, StmtVisitor):
+    # Marks the top-level functions whose result depends only on their arguments, so calls to them can be memoized.
+    # Such a function doesn't print, touch fields or `this`, assign globals or declare functions or classes that could
+    # outlive the call. The only globals it may read are declared once and never assigned, and the only functions it
+    # may call are other pure ones, found by dropping functions until every call left is to a pure one. It runs on the
+    # whole resolved program, since any statement anywhere could assign a global a function reads. At the prompt, one
+    # Purity sees every line in turn and keeps what the earlier ones declared and assigned, so a line that assigns or
+    # redeclares a global clears `pure` on the functions depending on it before the line runs. A global is only ever
+    # declared or assigned more, so a function that stops being pure never becomes pure again.
+    def __init__(self):
+        self.declarations = Counter()
+        self.assigned = set()
+        self.functions = []
+        self.current = None
+
+    def analyzeProgram(self, statements):
+        for statement in statements:
+            if isinstance(statement, (Var, Function, Class)):
+                self.declarations[statement.name.lexeme] += 1
+            if isinstance(statement, Function):
+                self.current = Facts(statement)
+                self.functions.append(self.current)
+                self.analyzeStatements(statement.body)
+                self.current = None
+            else:
+                self.analyze(statement)
+
+        constant = {name for name, count in self.declarations.items() if count == 1 and name not in self.assigned}
+        pure = {
+            facts.function.name.lexeme for facts in self.functions
+            if not facts.impure and facts.reads <= constant and facts.function.name.lexeme in constant
+        }
+        while True:
+            dropped = {
+                facts.function.name.lexeme for facts in self.functions
+                if facts.function.name.lexeme in pure and not facts.calls <= pure
+            }
+            if not dropped:
+                break
+            pure -= dropped
+        for facts in self.functions:
+            facts.function.pure = facts.function.name.lexeme in pure
+        return statements
+
+    def analyzeStatements(self, statements):
+        for statement in statements:
+            self.analyze(statement)
+
+    def analyze(self, node):
+        node.accept(self)
+
+    def impure(self):
+        if self.current:
+            self.current.impure = True
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        self.analyze(expr.value)
+        if expr.depth is None:
+            self.assigned.add(expr.name.lexeme)
+            self.impure()
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.analyze(expr.left)
+        self.analyze(expr.right)
+
+    def visitCallExpr(self, expr: Call):
+        if self.current and type(expr.callee) is Variable and expr.callee.depth is None:
+            self.current.calls.add(expr.callee.name.lexeme)
+        else:
+            self.impure()
+            self.analyze(expr.callee)
+        for argument in expr.arguments:
+            self.analyze(argument)
+
+    def visitGetExpr(self, expr: Get):
+        self.impure()
+        self.analyze(expr.object)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.analyze(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.analyze(expr.left)
+        self.analyze(expr.right)
+
+    def visitSetExpr(self, expr: Set):
+        self.impure()
+        self.analyze(expr.object)
+        self.analyze(expr.value)
+
+    def visitSuperExpr(self, expr: Super):
+        self.impure()
+
+    def visitThisExpr(self, expr: This):
+        self.impure()
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.analyze(expr.right)
+
+    def visitVariableExpr(self, expr: Variable):
+        if self.current and expr.depth is None:
+            self.current.reads.add(expr.name.lexeme)
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        self.analyzeStatements(stmt.statements)
+
+    def visitClassStmt(self, stmt: Class):
+        self.impure()
+        if stmt.superclass:
+            self.analyze(stmt.superclass)
+        for method in stmt.methods:
+            self.analyze(method)
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.analyze(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.impure()
+        self.analyzeStatements(stmt.body)
+
+    def visitIfStmt(self, stmt: If):
+        self.analyze(stmt.condition)
+        self.analyze(stmt.thenBranch)
+        if stmt.elseBranch:
+            self.analyze(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.impure()
+        self.analyze(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            self.analyze(stmt.value)
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer:
+            self.analyze(stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While):
+        if stmt.condition is not None:
+            self.analyze(stmt.condition)
+        self.analyze(stmt.body)
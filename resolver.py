@@ -1,19 +1,51 @@
 from typing import Union
 
 from classes import ClassType, INIT_METHOD_NAME
-from expressions import Unary, Literal, Grouping, Binary, Expr, Variable, Logical, Call, Assign, Get, Set, This, Super
+from expressions import (
+    Unary, Literal, Grouping, Binary, Expr, Variable, Logical, Call, Assign, Get, Set, This, Super, Invoke,
+)
 from exprvisitor import ExprVisitor
 from functions import FunctionType
-from interpreter import Interpreter
 from statements import Block, Print, Expression, Stmt, While, Var, Return, If, Function, Class
 from stmtvisitor import StmtVisitor
 from tokens import Token
 from util import Errors
 
 
+class Scope:
+    # The locals of one block or function body. Each gets the next slot of the frame the interpreter creates for the
+    # scope, so the frame's size is known before it runs. A block whose locals can't be captured shares the frame of
+    # an enclosing scope instead of getting its own.
+    def __init__(self, frame=None):
+        self.slots = {}
+        self.defined = set()
+        self.frame = frame or self
+        self.size = 0
+
+    def declare(self, name):
+        self.slots[name] = self.frame.size
+        self.frame.size += 1
+
+    def define(self, name):
+        self.defined.add(name)
+
+
+def declaresClosure(statements):
+    # Only a function or class declared in a block can capture one of its locals.
+    for statement in statements:
+        if isinstance(statement, (Function, Class)):
+            return True
+        if isinstance(statement, Block) and declaresClosure(statement.statements):
+            return True
+        if isinstance(statement, If) and declaresClosure([statement.thenBranch, statement.elseBranch]):
+            return True
+        if isinstance(statement, While) and declaresClosure([statement.body]):
+            return True
+    return False
+
+
 class Resolver(ExprVisitor, StmtVisitor):
-    def __init__(self, interpreter: Interpreter):
-        self.interpreter = interpreter
+    def __init__(self):
         self.scopes = []
         self.currentFunctionType = FunctionType.NONE
         self.currentClassType = ClassType.NONE
@@ -30,38 +62,51 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.currentFunctionType = type
 
         self.beginScope()
+        if type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            # A method's frame holds its `this` ahead of its parameters, so calling it needs no frame of its own for
+            # `this`.
+            self.curScope.declare('this')
         for param in function.params:
             self.declare(param)
             self.define(param)
         self.resolveStatements(function.body)
-        self.endScope()
+        function.size = self.endScope().size
 
         self.currentFunctionType = enclosingFunctionType
 
-    def beginScope(self):
-        self.scopes.append({})
+    def beginScope(self, frame=None):
+        self.scopes.append(Scope(frame))
 
     def endScope(self):
-        self.scopes.pop()
+        return self.scopes.pop()
 
     def declare(self, name: Token):
-        if name.lexeme in self.curScope:
+        # Returns the slot of the new local, or None at the top level, where variables are globals.
+        if not self.scopes:
+            return None
+        if name.lexeme in self.curScope.slots:
             Errors.error("Already a variable with this name in this scope.", name)
-        self.curScope[name.lexeme] = False
+        self.curScope.declare(name.lexeme)
+        return self.curScope.slots[name.lexeme]
 
     def define(self, name: Token):
-        self.curScope[name.lexeme] = True
+        if self.scopes:
+            self.curScope.define(name.lexeme)
 
     def resolveLocal(self, expr: Expr, name: Token):
-        i = len(self.scopes) - 1
-        while i >= 0:
-            if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
-            i -= 1
+        depth = 0
+        for scope in reversed(self.scopes):
+            slot = scope.slots.get(name.lexeme)
+            if slot is not None:
+                expr.depth = depth
+                expr.slot = slot
+                return
+            if scope.frame is scope:
+                depth += 1
 
     @property
     def curScope(self):
-        return self.scopes[-1] if self.scopes else {}
+        return self.scopes[-1]
 
     # Implement ExprVisitor
     def visitAssignExpr(self, expr: Assign):
@@ -76,6 +121,8 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve(expr.callee)
         for argument in expr.arguments:
             self.resolve(argument)
+        if type(expr) is Call and type(expr.callee) is Get:
+            expr.__class__ = Invoke
 
     def visitGetExpr(self, expr: Get):
         self.resolve(expr.object)
@@ -110,21 +157,32 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve(expr.right)
 
     def visitVariableExpr(self, expr: Variable):
-        if self.scopes and self.curScope.get(expr.name.lexeme) is False:
+        name = expr.name.lexeme
+        if self.scopes and name in self.curScope.slots and name not in self.curScope.defined:
             Errors.error("Can't read local variable in its own initializer.", expr.name)
         self.resolveLocal(expr, expr.name)
 
     # Implement StmtVisitor
     def visitBlockStmt(self, stmt: Block):
-        self.beginScope()
-        self.resolveStatements(stmt.statements)
-        self.endScope()
+        # Blocks declaring nothing run in the enclosing frame, as do blocks declaring nothing a closure could capture
+        # when there is an enclosing local scope, a function's or another block's, to share a frame with. Their size
+        # stays None. A block directly at the top level has only the globals around it, so it gets its own frame.
+        if not any(isinstance(statement, (Var, Function, Class)) for statement in stmt.statements):
+            self.resolveStatements(stmt.statements)
+        elif self.scopes and not declaresClosure(stmt.statements):
+            self.beginScope(self.curScope.frame)
+            self.resolveStatements(stmt.statements)
+            self.endScope()
+        else:
+            self.beginScope()
+            self.resolveStatements(stmt.statements)
+            stmt.size = self.endScope().size
 
     def visitClassStmt(self, stmt: Class):
         enclosingClassType = self.currentClassType
         self.currentClassType = ClassType.CLASS
 
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         self.define(stmt.name)
 
         if stmt.superclass:
@@ -133,10 +191,8 @@ class Resolver(ExprVisitor, StmtVisitor):
                 Errors.error("A class can't inherit from itself.", stmt.superclass.name)
             self.resolve(stmt.superclass)
             self.beginScope()
-            self.curScope['super'] = True
+            self.curScope.declare('super')
 
-        self.beginScope()
-        self.curScope['this'] = True
         for method in stmt.methods:
             declarationFunctionType = (
                 FunctionType.INITIALIZER
@@ -144,7 +200,6 @@ class Resolver(ExprVisitor, StmtVisitor):
                 else FunctionType.METHOD
             )
             self.resolveFunction(method, declarationFunctionType)
-        self.endScope()
 
         if stmt.superclass:
             self.endScope()
@@ -155,7 +210,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve(stmt.expression)
 
     def visitFunctionStmt(self, stmt: Function):
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         self.define(stmt.name)
         self.resolveFunction(stmt, FunctionType.FUNCTION)
 
@@ -175,9 +230,10 @@ class Resolver(ExprVisitor, StmtVisitor):
             if self.currentFunctionType == FunctionType.INITIALIZER:
                 Errors.error("Can't return a value from an initializer.", stmt.keyword)
             self.resolve(stmt.value)
+            stmt.tailCall = isinstance(stmt.value, Call)
 
     def visitVarStmt(self, stmt: Var):
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
         if stmt.initializer:
             self.resolve(stmt.initializer)
         self.define(stmt.name)
@@ -1,22 +1,155 @@
+import mmap
+import re
 import string
+import sys
+from contextlib import contextmanager
 
-from tokens import Token, TokenType
+from tokens import Token, TokenBuffer, TokenType
 from util import Errors
 
+KEYWORDS = {
+    'and': TokenType.AND,
+    'class': TokenType.CLASS,
+    'else': TokenType.ELSE,
+    'false': TokenType.FALSE,
+    'for': TokenType.FOR,
+    'fun': TokenType.FUN,
+    'if': TokenType.IF,
+    'nil': TokenType.NIL,
+    'or': TokenType.OR,
+    'print': TokenType.PRINT,
+    'return': TokenType.RETURN,
+    'super': TokenType.SUPER,
+    'this': TokenType.THIS,
+    'true': TokenType.TRUE,
+    'var': TokenType.VAR,
+    'while': TokenType.WHILE,
+}
+
+OPERATORS = {
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '!': TokenType.BANG,
+    '!=': TokenType.BANG_EQUAL,
+    '=': TokenType.EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '<': TokenType.LESS,
+    '<=': TokenType.LESS_EQUAL,
+    '>': TokenType.GREATER,
+    '>=': TokenType.GREATER_EQUAL,
+}
+
+# One alternative per lexeme class, tried in order. The group number of a match (`lastindex`) tells the scanner what
+# kind of lexeme it got, so each token costs a single regex step instead of a Python call per character.
+LEXEME_PATTERN = '|'.join([
+    r'([ \t\r]+)',
+    r'([A-Za-z_][A-Za-z0-9_]*)',
+    r'([!=<>]=?|[(){},.\-+;*]|/(?!/))',
+    r'(\n)',
+    r'([0-9]+(?:\.[0-9]+)?)',
+    r'("[^"]*")',
+    r'(//[^\n]*)',
+    r'(.)',
+])
+WHITESPACE, IDENTIFIER, OPERATOR, NEWLINE, NUMBER, STRING, COMMENT, UNEXPECTED = range(1, 9)
+
+LEXEME = re.compile(LEXEME_PATTERN)
+# Mapped scripts are scanned as UTF-8 bytes, where an unexpected character can take several bytes; they are matched
+# together so the character decodes and is reported once, as it is when scanning a str.
+LEXEME_BYTES = re.compile(LEXEME_PATTERN.replace(r'(.)', r'([\xc0-\xf7][\x80-\xbf]*|.)').encode())
+
+
+@contextmanager
+def openSource(path):
+    # Map the script into memory so it's scanned lazily as the parser pulls tokens, without reading it into a `str`.
+    with open(path, 'rb') as sourceFile:
+        try:
+            source = mmap.mmap(sourceFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files can't be mapped
+            yield b''
+            return
+        with source:
+            yield source
+
 
 class Scanner:
 
-    def __init__(self, source):
+    def __init__(self, source, engine='regex'):
         self.tokens = []
         self.start = 0
         self.current = 0
         self.line = 1
         self.source = source
+        self.engine = engine
 
     def isAtEnd(self):
         return self.current >= len(self.source)
 
     def scanTokens(self):
+        if self.engine == 'char':
+            return self.scanTokensByChar()
+        self.tokens.extend(self.iterTokens())
+        return self.tokens
+
+    def iterTokens(self):
+        # While a token is being handed out, `start` and `current` are the offsets of its lexeme in the source.
+        # Identifiers and string literals are interned, so the dicts keyed by names (environments, instance fields,
+        # method tables) hit the identity fast path instead of comparing characters.
+        source = self.source
+        binary = not isinstance(source, str)
+        intern = sys.intern
+        line = self.line
+        for match in (LEXEME_BYTES if binary else LEXEME).finditer(source):
+            kind = match.lastindex
+            if kind == WHITESPACE:
+                continue
+            text = match.group()
+            if binary:
+                text = text.decode()
+            self.start, self.current = match.span()
+            if kind == IDENTIFIER:
+                tokenType = KEYWORDS.get(text)
+                if tokenType is None:
+                    text = intern(text)
+                    yield Token(TokenType.IDENTIFIER, text, text, line)
+                else:
+                    yield Token(tokenType, text, None, line)
+            elif kind == OPERATOR:
+                yield Token(OPERATORS[text], text, None, line)
+            elif kind == NEWLINE:
+                line += 1
+            elif kind == NUMBER:
+                yield Token(TokenType.NUMBER, text, float(text), line)
+            elif kind == STRING:
+                line += text.count('\n')
+                yield Token(TokenType.STRING, text, intern(text[1:-1]), line)
+            elif kind == UNEXPECTED:
+                if text == '"':
+                    line += source.count(b'\n' if binary else '\n', match.end())
+                    Errors.errorAt(line, 'Unterminated string.')
+                    break
+                Errors.errorAt(line, 'Unexpected character.')
+
+        self.line = line
+        self.start = self.current = len(source)
+        yield Token(TokenType.EOF, "", None, line)
+
+    def scanCompact(self):
+        buffer = TokenBuffer(self.source)
+        for token in self.iterTokens():
+            buffer.append(token.type, self.start, self.current, token.line)
+        return buffer
+
+    def scanTokensByChar(self):
         while not self.isAtEnd():
             self.start = self.current
             self.scanToken()
@@ -46,7 +179,7 @@ class Scanner:
                 slf.advance()
 
             if slf.isAtEnd():
-                Errors.error(slf.line, 'Unterminated string.')
+                Errors.errorAt(slf.line, 'Unterminated string.')
                 return None
 
             # Handle closing '"'
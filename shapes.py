@@ -0,0 +1,34 @@
+class Shape:
+    # The layout of an instance's fields: the index of each name in the instance's list of values. Every class starts
+    # its instances on its own empty shape, and adding a field moves an instance to the shape with that name after the
+    # ones it had. The move is remembered, so instances that gain the same fields in the same order share their shapes,
+    # and a shape is enough to know where a field is, and which class's methods come first.
+    __slots__ = ('cls', 'indices', 'transitions')
+    created = 0
+
+    def __init__(self, cls, indices):
+        self.cls = cls
+        self.indices = indices
+        self.transitions = {}
+        Shape.created += 1
+
+    def withField(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = Shape(self.cls, {**self.indices, name: len(self.indices)})
+            self.transitions[name] = shape
+        return shape
+
+    def lookup(self, name):
+        # What reading `name` finds on an instance of this shape: a method, the index of a field, or None.
+        method = self.cls.findMethod(name)
+        return method if method else self.indices.get(name)
+
+    def store(self, name):
+        # Where writing `name` goes: the index of the field, or the shape an instance moves to when adding it.
+        index = self.indices.get(name)
+        return self.withField(name) if index is None else index
+
+    @staticmethod
+    def stats():
+        return {'created': Shape.created}
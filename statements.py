@@ -1,63 +1,82 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from expressions import Expr, Variable
 from tokens import Token
 
 
 class Stmt:
+    # Declarations carry the `slot` the Resolver gave the declared name in its scope's frame, or None for globals.
+    # Blocks and functions carry the `size` of the frame they need; a Block of size None runs in the enclosing frame.
+    # A Return is a `tailCall` when its value is a call whose result is returned as is.
+    # A Function is `pure` when Purity proved its result depends only on its arguments.
+    __slots__ = ()
+
     def accept(self, visitor):
         return getattr(visitor, f'visit{type(self).__name__}Stmt')(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Stmt):
     statements: list
+    size: int = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Class(Stmt):
     name: Token
     superclass: Variable
     methods: list
+    slot: int = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression(Stmt):
     expression: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class Function(Stmt):
     name: Token
     params: list
     body: list
+    slot: int = field(default=None, compare=False)
+    size: int = field(default=0, compare=False)
+    pure: bool = field(default=False, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class If(Stmt):
     condition: Expr
     thenBranch: Stmt
     elseBranch: Stmt
 
 
-@dataclass
+@dataclass(slots=True)
 class Print(Stmt):
     expression: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Stmt):
     keyword: Token
     value: Expr
+    tailCall: bool = field(default=False, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Var(Stmt):
     name: Token
     initializer: Expr
+    slot: int = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class While(Stmt):
-    condition: Expr
+    condition: Expr  # None once the Optimizer has found it always true.
     body: Stmt
+
+
+@dataclass(slots=True)
+class CompareWhile(While):
+    # A While whose condition is a Binary, found by Lowering: the loop applies the operator itself on every iteration.
+    pass
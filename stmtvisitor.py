@@ -1,6 +1,6 @@
 import abc
 
-from statements import Expression, Print, Block, Function, If, Return, Var, While, Class
+from statements import Expression, Print, Block, Function, If, Return, Var, While, Class, CompareWhile
 
 
 class StmtVisitor(abc.ABC):
@@ -39,3 +39,7 @@ class StmtVisitor(abc.ABC):
     @abc.abstractmethod
     def visitWhileStmt(self, stmt: While):
         pass
+
+    # A superinstruction; visitors without a faster way to run it see the While it was made from.
+    def visitCompareWhileStmt(self, stmt: CompareWhile):
+        return self.visitWhileStmt(stmt)
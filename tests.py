@@ -1,7 +1,30 @@
+import contextlib
+import glob
+import io
+import os
+import shutil
+import tempfile
+
+from astcache import AstCache
 from astprinter import Binary, Literal, Grouping, Unary, AstPrinter
+from closurecompiler import ClosureInterpreter
+from environment import Environment
+from incremental import IncrementalFrontEnd
+from inlinecache import InlineCache, LIMIT
+from interpreter import Interpreter
+from lowering import Lowering
 from lox import Lox
-from scanner import Scanner
-from tokens import Token, TokenType
+from memo import Memo
+from memstats import astMemory
+from optimizer import Optimizer
+from parser import Parser, PrattParser
+from scanner import Scanner, openSource
+from shapes import Shape
+from tokens import TokenType
+from transpiler import Transpiler
+from typeinference import TypeInference
+from util import Errors
+from vm import VM
 
 
 lexerCases = ('Lexer', [
@@ -12,21 +35,79 @@ lexerCases = ('Lexer', [
     ('someVar', '[(TokenType.IDENTIFIER, someVar), (TokenType.EOF, None)]'),
     ('for', '[(TokenType.FOR, None), (TokenType.EOF, None)]'),
     ('while', '[(TokenType.WHILE, None), (TokenType.EOF, None)]'),
+    ('print "crème";'.encode(), '[(TokenType.PRINT, None), (TokenType.STRING, crème), (TokenType.SEMICOLON, None), (TokenType.EOF, None)]'),
+])
+
+
+def describeTokens(tokens):
+    return [(token.type, token.lexeme, token.literal, token.line) for token in tokens]
+
+
+def scanWith(source, engine):
+    return describeTokens(Scanner(source, engine).scanTokens())
+
+
+scannerEngineCases = ('Scanner engines', [
+    (source, 'True') for source in [
+        'var a = 1;\n// comment\nprint a >= 2.5 != !b;',
+        'print "multi\nline";\nx = y / z;',
+        'fun f(a, b) { return a <= b == (a < b); }',
+    ] + [open(path).read() for path in sorted(glob.glob('programs/*.lox'))]
+])
+
+compactBufferCases = ('Compact token buffer', scannerEngineCases[1])
+
+
+def scanReportingErrors(source):
+    errors = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(errors):
+            return describeTokens(Scanner(source).scanTokens()), errors.getvalue()
+    finally:
+        Errors.hadError = False
+
+
+def scanMapped(source):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'script.lox')
+        with open(path, 'w', encoding='utf-8') as script:
+            script.write(source)
+        with openSource(path) as mapped:
+            return scanReportingErrors(mapped) == scanReportingErrors(source)
+    finally:
+        shutil.rmtree(directory)
+
+
+mappedScannerCases = ('Mapped scanner', [
+    ('var é = 1;', 'True'),
+    ('print "naïve" + "€";\nx ← 2;', 'True'),
+    ('a = 1; // ünïcode comment\n😀', 'True'),
+])
+
+
+def sameLiteral(tokens):
+    return tokens[0].literal is tokens[-2].literal
+
+
+internCases = ('Interning', [
+    ('name name', 'True'),
+    ('"text" + "text"', 'True'),
 ])
 
 
 astCases = ('AST', [
     (Binary(
         left=Literal(value=1),
-        operator=Token(TokenType.PLUS, '+', None, 1),
+        operator=TokenType.PLUS,
         right=Literal(value=2),
     ), '(+ 1 2)'),
     (Binary(
         Unary(
-            Token(TokenType.MINUS, "-", None, 1),
+            TokenType.MINUS,
             Literal(123)
         ),
-        Token(TokenType.STAR, "*", None, 1),
+        TokenType.STAR,
         Grouping(
             Literal(45.6)
         )
@@ -48,6 +129,349 @@ parserCases = ('Parser', [
     ('1>2;', 'False'),
     ('2>=2;', 'True'),
     ('print "a"; print 1; 2<=2;', 'True'),
+    ('2 * 3;', '6.0'),
+    ('1 != 2;', 'True'),
+    ('fun f(n) { if (n < 2) return n; return f(n - 1) + f(n - 2); } f(10);', '55.0'),
+    ('class A { init(x) { this.x = x; } get() { return this.x; } } A(4).get();', '4.0'),
+    ('fun f() { var a = 1; { var a = 2; return a; } } f();', '2.0'),
+    ('fun make() { var n = 0; fun inc() { n = n + 1; return n; } return inc; } var c = make(); c(); c();', '2.0'),
+    ('class A { init() {} } var a = A(); a.init();', 'A instance'),
+    ('fun f() { return 1; } var a = f(); fun f() { return 2; } a + f();', '3.0'),
+    ('fun f() { var a = 1; { var a = 2; a = a + 1; } return a; } f();', '1.0'),
+    ('fun f() { var g = nil; for (var i = 0; i < 2; i = i + 1) { var j = i; fun h() { return j; } if (i == 0) g = h; } return g(); } f();', '0.0'),
+    ('fun f(n) { while (true) { { if (n > 2) return n; } n = n + 1; } } fun g() { f(0); } f(1) + f(5);', '8.0'),
+    ('fun count(n, total) { if (n == 0) return total; return count(n - 1, total + n); } count(20000, 0);', '200010000.0'),
+    ('fun even(n) { if (n == 0) return true; return odd(n - 1); } fun odd(n) { if (n == 0) return false; return even(n - 1); } even(20001);', 'False'),
+    ('class A { init(x) { this.x = x; } get() { return this.x; } } var g = A(3).get; g();', '3.0'),
+    ('class A {} fun f(n) { return n + 1; } var a = A(); a.f = f; a.f(1);', '2.0'),
+    ('class A { init() { this.n = 5; } make() { fun g() { return this.n; } return g; } } A().make()();', '5.0'),
+    ('class A { init(n) { this.n = n; } add(k) { return this.n + k; } } class B < A { add(k) { return super.add(k) * 2; } } var b = B(1); b.init(4).add(1);', '10.0'),
+    ('class C { count(n, t) { if (n == 0) return t; return this.count(n - 1, t + n); } } C().count(20000, 0);', '200010000.0'),
+    ('class A { init(n) { this.n = n; } f() { return 1; } } class B < A { f() { return 2; } } class C < B {} C(5).n + C(0).f();', '7.0'),
+])
+
+
+def runWith(interpreter):
+    lox = Lox()
+    lox.interpreter = interpreter
+    return lox.run
+
+
+closureCases = ('Closure backend', parserCases[1])
+
+vmCases = ('Bytecode VM', parserCases[1] + [
+    ('class A { m() { return 1; } } class B < A { m() { return super.m() + 1; } } B().m();', '2.0'),
+    ('class A { init() { this.f = g; } } fun g() { return 3; } A().f();', '3.0'),
+])
+
+
+def compileErrors(source):
+    errors = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(errors):
+            runWith(VM())(source)
+    finally:
+        Errors.hadError = False
+    return sorted(set(errors.getvalue().splitlines()))
+
+
+bytecodeLimitCases = ('Bytecode limits', [
+    ('fun f() { ' + ' '.join(f'var v{i} = {i};' for i in range(300)) + ' }',
+     "['[line 1] Error: Too many local variables in function.']"),
+    ('fun a() { ' + ' '.join(f'var a{i} = {i};' for i in range(200)) + ' fun b() { '
+     + ' '.join(f'var b{i} = {i};' for i in range(200)) + ' fun c() { var s; '
+     + ' '.join(f's = a{i}; s = b{i};' for i in range(200)) + ' } } }',
+     "['[line 1] Error: Too many closure variables in function.']"),
+])
+
+
+def lastOpcodeLine(source):
+    # The line recorded for the script's trailing expression's last opcode, the one before the RETURN.
+    function = VM().compiler.compile(Lox().analyze(source))
+    return function.chunk.lines[-2]
+
+
+opcodeLineCases = ('Bytecode lines', [
+    ('var a = 1;\nvar b = 2;\na\n-\nb;', '4'),
+    ('var a = 1;\n-\na;', '2'),
+    ('var a = 1;\n!\na;', '2'),
+    ('var a = 1;\nvar b = 2;\n(a\n==\nb);', '4'),
+])
+
+
+def movedOperatorLine(buffers):
+    frontEnd = IncrementalFrontEnd()
+    for source in buffers:
+        statements = frontEnd.update(source)
+    return statements[-1].expression.line
+
+
+movedLineCases = ('Incremental operator lines', [
+    (('var a = 1;\na\n-\na;', '// moved\nvar a = 1;\na\n-\na;'), '4'),
+    (('var a = 1;\n!\na;', '\n\nvar a = 1;\n!\na;'), '4'),
+])
+
+
+def runOnTwoInterpreters(source):
+    statements = Lox().analyze(source)
+    return [Interpreter().interpret(statements) for _ in range(2)]
+
+
+globalCases = ('Global table', [
+    ('var a = 1; a = a + 1; a;', '[2.0, 2.0]'),
+    ('fun f(n) { if (n < 1) return 0; return g(n); } fun g(n) { return f(n - 1) + 1; } f(3);', '[3.0, 3.0]'),
+])
+
+
+def countElided(source):
+    elided = Environment.elided
+    Environment.counting = True
+    try:
+        result = Lox().run(source)
+    finally:
+        Environment.counting = False
+    return result, Environment.elided - elided
+
+
+elisionCases = ('Environment elision', [
+    ('var a = 0; { a = 1; } a;', '(1.0, 1)'),
+    ('fun f() { var s = 0; for (var i = 0; i < 3; i = i + 1) { var j = i; s = s + j; } return s; } f();', '(3.0, 7)'),
+    ('var s = 0; for (var i = 0; i < 3; i = i + 1) { s = s + i; } s;', '(3.0, 6)'),
+])
+
+
+def runOptimized(source):
+    lox = Lox()
+    lox.optimize = 1
+    removed = Optimizer.removed
+    result = lox.run(source)
+    return result, Optimizer.removed - removed
+
+
+optimizerCases = ('Optimizer', [
+    ('1 + 2 * 3;', '(7.0, 4)'),
+    ('!!true;', '(True, 2)'),
+    ('"a" + "b";', "('ab', 2)"),
+    ('var x = 5; false or x;', '(5.0, 2)'),
+    ('var a = 0; if (false) a = 1; else a = 2; a;', '(2.0, 5)'),
+    ('fun f() { return 1; print "dead"; } f();', '(1.0, 2)'),
+    ('fun f() { var n = 0; for (;;) { n = n + 1; if (n > 3) return n; } } f();', '(4.0, 1)'),
+    ('fun f() { while (1 > 2) print "never"; return 3; } f();', '(3.0, 6)'),
+])
+
+
+def runSpecialized(source):
+    lox = Lox()
+    lox.optimize = 2
+    specialized = TypeInference.specialized
+    result = lox.run(source)
+    return result, TypeInference.specialized - specialized
+
+
+typeInferenceCases = ('Type inference', [
+    ('fun f() { var s = 0; for (var i = 0; i < 10; i = i + 1) s = s + i; return s; } f();', '(45.0, 3)'),
+    ('fun f(n) { if (n < 2) return n; return f(n - 1) + f(n - 2); } f(10);', '(55.0, 3)'),
+    ('fun f() { var s = "a"; var t = s + "b"; return t + s; } f();', "('aba', 2)"),
+    ('fun f() { var x = 1; fun g() { x = "a"; } g(); return x + "b"; } f();', "('ab', 0)"),
+    ('fun f(a, b, numbers) { if (numbers) return a * 2 + b * 2; return a + b; } f("a", "b", false);', "('ab', 4)"),
+])
+
+
+def runLowered(source):
+    lowered = Lowering.lowered
+    result = Lox().run(source)
+    return result, Lowering.lowered - lowered
+
+
+loweringCases = ('Superinstructions', [
+    ('var i = 0; while (i < 3) i = i + 1; i;', '(3.0, 2)'),
+    ('class C { init() { this.n = 1; } add(k) { this.n = this.n + k; return this.n; } } var c = C(); c.n = c.n * 3; c.add(2);', '(5.0, 2)'),
+    ('var a = 1; var b = 2; a = b + 1; while (a) a = !a; a;', '(False, 0)'),
+    ('fun f() { var s = ""; for (var i = 0; i < 3; i = i + 1) s = s + "ab"; return s; } f();', "('ababab', 3)"),
+])
+
+
+def countCacheHits(source):
+    hits, misses = InlineCache.hits, InlineCache.misses
+    InlineCache.counting = True
+    try:
+        result = Lox().run(source)
+    finally:
+        InlineCache.counting = False
+    return result, InlineCache.hits - hits, InlineCache.misses - misses
+
+
+inlineCacheCases = ('Inline caches', [
+    ('class A { m() { return 1; } } class B < A {} var b = B(); b.x = 2; var s = 0; for (var i = 0; i < 3; i = i + 1) s = s + b.m() + b.x; s;', '(9.0, 4, 3)'),
+    ('class A { v() { return 1; } } class B { v() { return 2; } } fun f(o) { return o.v(); } f(A()) + f(B()) + f(A());', '(4.0, 1, 2)'),
+    ('class A { m() { return 1; } } class B < A { m() { return super.m() + 1; } } B().m() + B().m();', '(4.0, 1, 3)'),
+    ('class A { m() { return "method"; } } var a = A(); a.m = "field"; a.m();', "('method', 0, 2)"),
+])
+
+
+def countRerunCacheHits(source):
+    # The chunk is run again past the point every slot of its sites would hold a shape of an earlier run.
+    lox = Lox()
+    InlineCache.counting = True
+    try:
+        for _ in range(LIMIT + 2):
+            hits, misses = InlineCache.hits, InlineCache.misses
+            result = lox.runBuffer(source)
+    finally:
+        InlineCache.counting = False
+    return result, InlineCache.hits - hits, InlineCache.misses - misses
+
+
+rerunCacheCases = ('Inline caches on rerun', [
+    ('class A { init() { this.x = 1; } } var a = A(); var s = 0; for (var i = 0; i < 5; i = i + 1) s = s + a.x; s;', '(5.0, 4, 2)'),
+    ('class A { m() { return 1; } } class B < A { m() { return super.m(); } } var b = B(); b.m() + b.m();', '(2.0, 1, 3)'),
+])
+
+
+def countShapes(source):
+    created = Shape.created
+    result = Lox().run(source)
+    return result, Shape.created - created
+
+
+shapeCases = ('Shapes', [
+    ('class P { init(x, y) { this.x = x; this.y = y; } } var s = 0; for (var i = 0; i < 10; i = i + 1) { var p = P(i, 1); s = s + p.x + p.y; } s;', '(55.0, 3)'),
+    ('class P {} fun f(o) { return o.a - o.b; } var p = P(); p.a = 5; p.b = 1; var q = P(); q.b = 3; q.a = 10; f(p) + f(q);', '(11.0, 5)'),
+    ('class P {} var p = P(); p.a = 1; p.a = 2; p.a = p.a + 1; p.a;', '(3.0, 2)'),
+])
+
+
+def runMemoized(source):
+    hits, evictions = Memo.hits, Memo.evictions
+    lox = Lox()
+    lox.memoize = True
+    result = lox.run(source)
+    return result, Memo.hits - hits, Memo.evictions - evictions
+
+
+memoCases = ('Memoization', [
+    ('fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); } fib(25);', '(75025.0, 23, 0)'),
+    ('var base = 10; fun add(n) { return n + base; } fun twice(n) { return add(n) + add(n); } twice(1) + twice(1);', '(44.0, 2, 0)'),
+    ('var calls = 0; fun f(n) { calls = calls + 1; return n; } f(1) + f(1) + calls;', '(4.0, 0, 0)'),
+    ('var k = 1; fun f(n) { return n + k; } var a = f(1); k = 2; a + f(1);', '(5.0, 0, 0)'),
+    ('fun f(n) { return clock() * 0 + n; } fun g(n) { return f(n); } g(1) + g(1);', '(2.0, 0, 0)'),
+    ('fun neg(n) { return -n; } neg(0); neg(-0);', '(0.0, 0, 0)'),
+    ('fun sq(n) { return n * n; } for (var i = 0; i < 1100; i = i + 1) sq(i); sq(0) + sq(1099);', '(1207801.0, 1, 77)'),
+])
+
+
+def runMemoizedLines(lines):
+    # Each line run on its own, as at the prompt.
+    hits = Memo.hits
+    lox = Lox()
+    lox.memoize = True
+    results = [lox.run(line) for line in lines]
+    return results, Memo.hits - hits
+
+
+promptMemoCases = ('Memoization at the prompt', [
+    (['fun sq(n) { return n * n; }', 'sq(3);', 'sq(3);'], '([None, 9.0, 9.0], 1)'),
+    (['var k = 1; fun f(n) { return n + k; }', 'f(1);', 'k = 2;', 'f(1);'], '([None, 2.0, 2.0, 3.0], 0)'),
+    (['var k = 1; fun f(n) { return n + k; }', 'f(1);', 'var k = 2;', 'f(1);'], '([None, 2.0, None, 3.0], 0)'),
+    (['fun g(n) { return n; } fun f(n) { return g(n); }', 'f(1);', 'f(1);', 'fun g(n) { return n * 10; }', 'f(1);'], '([None, 1.0, 1.0, None, 10.0], 1)'),
+    (['var k = 1; fun f(n) { return n + k; }', 'f(1);', 'var a = f(1); k = 2; a + f(1);'], '([None, 2.0, 5.0], 0)'),
+])
+
+
+def parseBoth(source):
+    tokens = Scanner(source).scanTokens()
+    return Parser(tokens).parse() == PrattParser(tokens).parse()
+
+
+prattCases = ('Pratt parser', [
+    (source, 'True') for source in [
+        '1 + 2 * 3 - 4 / 5;',
+        '-!-a == b != c < d <= e > f >= g;',
+        'a or b and c or d;',
+        'a = b.c = d(1)(2).e;',
+        'print this.x.y(1, 2 + 3) + super.m();',
+        'x = (a + b) * -c;',
+    ] + [open(path).read() for path in sorted(glob.glob('programs/*.lox'))]
+])
+
+
+def runEdited(buffers):
+    lox = Lox()
+    for source in buffers:
+        result = lox.runBuffer(source)
+    return result
+
+
+incrementalCases = ('Incremental front end', [
+    (('var a = 1;\nfun f(x) { return x + a; }\nf(1);', 'var a = 2;\nfun f(x) { return x + a; }\nf(1);'), '3.0'),
+    (('fun f(x) {\n  return x;\n}\nf(1);', 'var b = 5;\nfun f(x) {\n  return x;\n}\nf(b);'), '5.0'),
+    (('var a = 1;\nif (false) a = 2;\na;', 'var a = 1;\nif (false) a = 2;\nelse a = 3;\na;'), '3.0'),
+])
+
+
+def runCached(source):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'script.lox')
+        with open(path, 'w') as script:
+            script.write(source)
+        hits = AstCache.hits
+        results = [Lox().runFile(path) for _ in range(2)]
+        return results[0] == results[1] and AstCache.hits == hits + 1
+    finally:
+        shutil.rmtree(directory)
+
+
+cacheCases = ('AST cache', [
+    ('fun f(n) { var a = n; return a * 2; } f(21);', 'True'),
+    ('class A { init(x) { this.x = x; } } A(1).x;', 'True'),
+])
+
+
+def runTranspiled(source):
+    module = Transpiler().transpile(Lox().analyze(source))
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            exec(compile(module, 'transpiled.py', 'exec'), {'__name__': 'transpiled'})
+        except Exception as ex:
+            # Errors Lox reports as Python exceptions, as the tree interpreter does.
+            print(f'{type(ex).__name__}: {ex}')
+    return output.getvalue().strip()
+
+
+transpilerCases = ('Transpiler', [
+    ('fun f(n) { if (n < 2) return n; return f(n - 1) + f(n - 2); } print f(10);', '55.0'),
+    ('var a = "global"; { var a = "inner"; print a; } print a;', 'inner\nglobal'),
+    ('fun make() { var n = 0; fun inc() { n = n + 1; return n; } return inc; } var c = make(); c(); print c();', '2.0'),
+    ('var g; for (var i = 0; i < 2; i = i + 1) { var j = i; fun h() { return j; } if (i == 0) g = h; } print g();', '0.0'),
+    ('for (var i = 0; i < 2; i = i + 1) { var c = 0; fun inc() { c = c + 1; return c; } if (i == 1) print inc(); }', '1.0'),
+    ('var a; var b = a = 2; print a + b;', '4.0'),
+    ('class A { m() { return "method"; } } var a = A(); a.m = "field"; print a.m();', 'method'),
+    ('class A { m() { return "A"; } } class B < A { init() { return; } m() { fun f() { return super.m(); } return f() + "B"; } } print B().init().m();', 'AB'),
+    ('class P { init(x) { this.x = x; } } var p = P(1); p.x = p.x + 1; print p.x; print p; print P;', '2.0\nP instance\nP'),
+    ('var a = 1;\nprint b;', "[line 2 at \"b\"] Error: Undefined variable 'b'."),
+    ('class A {}\nA().x;', '[line 2 at "x"] Error: Undefined property \'x\''),
+    ('fun f(a, b) { return a + b; } print f(1);', 'Exception: Expected 2 arguments but got 1.'),
+    ('fun f() { fun g(a) { return a; } return g; } print f()(1, 2);', 'Exception: Expected 1 arguments but got 2.'),
+    ('class A { m(a, b) {} } A().m(1, 2, 3);', 'Exception: Expected 2 arguments but got 3.'),
+    ('class A { init(a) {} } A();', 'Exception: Expected 1 arguments but got 0.'),
+    ('print clock(1);', 'Exception: Expected 0 arguments but got 1.'),
+    ('class A { init(a) {} } var a = A(1); a.init();', 'Exception: Expected 1 arguments but got 0.'),
+    ('var a = "f"; a();', 'Exception: Can only call functions and classes.'),
+    ('class A {} A()();', 'Exception: Can only call functions and classes.'),
+    ('print "a" - 1;', "TypeError: unsupported operand type(s) for -: 'str' and 'float'"),
+])
+
+
+def countNodes(source):
+    usage = astMemory(Lox().analyze(source))
+    return {name: count for name, (count, size) in sorted(usage.items())}
+
+
+memoryCases = ('AST memory', [
+    ('print 1 + 2;', "{'Binary': 1, 'Literal': 2, 'Print': 1}"),
+    ('var a = 1; a = a * a;', "{'Assign': 1, 'Binary': 1, 'Expression': 1, 'Literal': 1, 'Token': 4, 'Var': 1, 'Variable': 2}"),
 ])
 
 
@@ -77,5 +501,30 @@ def test(caseDef, testFn):
 
 if __name__ == '__main__':
     test(lexerCases, lambda source: Scanner(source).scanTokens())
+    test(scannerEngineCases, lambda source: scanWith(source, 'regex') == scanWith(source, 'char'))
+    test(internCases, lambda source: sameLiteral(Scanner(source).scanTokens()))
+    test(internCases, lambda source: sameLiteral(Scanner(source).scanCompact()))
+    test(mappedScannerCases, scanMapped)
+    test(compactBufferCases, lambda source: scanWith(source, 'regex') == describeTokens(Scanner(source).scanCompact()))
     test(astCases, lambda expr: AstPrinter().print(expr))
+    test(prattCases, parseBoth)
     test(parserCases, lambda source: Lox().run(source))
+    test(closureCases, runWith(ClosureInterpreter()))
+    test(vmCases, runWith(VM()))
+    test(bytecodeLimitCases, compileErrors)
+    test(opcodeLineCases, lastOpcodeLine)
+    test(movedLineCases, movedOperatorLine)
+    test(globalCases, runOnTwoInterpreters)
+    test(elisionCases, countElided)
+    test(optimizerCases, runOptimized)
+    test(typeInferenceCases, runSpecialized)
+    test(loweringCases, runLowered)
+    test(inlineCacheCases, countCacheHits)
+    test(rerunCacheCases, countRerunCacheHits)
+    test(shapeCases, countShapes)
+    test(memoCases, runMemoized)
+    test(promptMemoCases, runMemoizedLines)
+    test(incrementalCases, runEdited)
+    test(cacheCases, runCached)
+    test(memoryCases, countNodes)
+    test(transpilerCases, runTranspiled)
@@ -1,7 +1,11 @@
+import sys
+from array import array
 from enum import Enum, auto
 
 
 class Token:
+    __slots__ = ('type', 'lexeme', 'literal', 'line')
+
     def __init__(self, tokenType, lexeme, literal, line):
         self.type = tokenType
         self.lexeme = lexeme
@@ -11,6 +15,9 @@ class Token:
     def __repr__(self):
         return f'({self.type}, {self.literal})'
 
+    def __reduce__(self):
+        return Token, (self.type, self.lexeme, self.literal, self.line)
+
 
 class TokenType(Enum):
     # Single-character tokens.
@@ -60,3 +67,56 @@ class TokenType(Enum):
     WHILE = auto()
 
     EOF = auto()
+
+
+TOKEN_TYPES = {tokenType.value: tokenType for tokenType in TokenType}
+
+
+class TokenBuffer:
+    # Compact token store: one entry per token in each of four parallel arrays. Lexemes and literals aren't stored;
+    # they're sliced out of the source when a token is asked for.
+    # The parsers and the AST share Token objects, so nothing in the pipeline keeps tokens this way; it serves tools
+    # holding many tokens, and the `tokenMemory` benchmark.
+    def __init__(self, source):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('Q')
+        self.lengths = array('I')
+        self.lines = array('I')
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        return self.token(index)
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self.token(index)
+
+    def append(self, tokenType, start, end, line):
+        self.types.append(tokenType.value)
+        self.starts.append(start)
+        self.lengths.append(end - start)
+        self.lines.append(line)
+
+    def lexeme(self, index):
+        start = self.starts[index]
+        lexeme = self.source[start:start + self.lengths[index]]
+        return lexeme if isinstance(lexeme, str) else lexeme.decode()
+
+    def token(self, index):
+        tokenType = TOKEN_TYPES[self.types[index]]
+        lexeme = self.lexeme(index)
+        if tokenType == TokenType.IDENTIFIER:
+            lexeme = literal = sys.intern(lexeme)
+        elif tokenType == TokenType.NUMBER:
+            literal = float(lexeme)
+        elif tokenType == TokenType.STRING:
+            literal = sys.intern(lexeme[1:-1])
+        else:
+            literal = None
+        return Token(tokenType, lexeme, literal, self.lines[index])
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (self.types, self.starts, self.lengths, self.lines))
@@ -0,0 +1,487 @@
+from classes import INIT_METHOD_NAME
+from expressions import Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Expr, Get, Set, This, Super
+from exprvisitor import ExprVisitor
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from stmtvisitor import StmtVisitor
+from tokens import TokenType
+
+# Copied to the top of every generated module, so that it runs without pylox. Lox names get a prefix in Python, which
+# keeps them apart from each other, from Python's keywords and builtins, and from the names in here: g_ for globals, l_
+# for locals (with a number, as Python has no block scope) and p_ for properties.
+RUNTIME = '''\
+# Generated by pylox.
+import sys
+import time
+from types import MethodType
+
+
+class LoxRuntimeError(Exception):
+    def __init__(self, name, message):
+        self.name = name
+        self.message = message
+
+
+class LoxClass(type):
+    # Lox classes are Python classes, with their Lox name as __name__. Property access on the class object itself is
+    # not an error here, as it is in Lox.
+    def __new__(mcs, name, bases, namespace, loxName):
+        return super().__new__(mcs, loxName, bases, namespace)
+
+    def __init__(cls, name, bases, namespace, loxName):
+        super().__init__(loxName, bases, namespace)
+        cls._initializer = getattr(cls, 'p_init', None)
+
+    def __str__(cls):
+        return cls.__name__
+
+    def __call__(cls, *arguments):
+        instance = object.__new__(cls)
+        if cls._initializer:
+            cls._initializer(instance, *arguments)
+        return instance
+
+    @property
+    def _arity(cls):
+        # On the metaclass, so that the class's instances don't have it and aren't taken for something callable.
+        return cls._initializer._arity if cls._initializer else 0
+
+
+class LoxInstance(metaclass=LoxClass, loxName='LoxInstance'):
+    def __str__(self):
+        return f'{type(self).__name__} instance'
+
+
+class LoxMethod:
+    # Wraps a method that shares its name with a field set somewhere in the program. Lox finds methods before fields;
+    # Python does the same only for data descriptors like this one.
+    def __init__(self, function):
+        self.function = function
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        return self.function if instance is None else MethodType(self.function, instance)
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+def _superclass(value, name):
+    if not isinstance(value, LoxClass):
+        raise LoxRuntimeError(name, 'Superclass must be a class.')
+    return value
+
+
+def _instance(value, name):
+    if not isinstance(value, LoxInstance):
+        raise LoxRuntimeError(name, 'Only instances have fields.')
+    return value
+
+
+def _set(instance, name, value):
+    setattr(instance, name, value)
+    return value
+
+
+def _assign(name, value):
+    if name not in globals():
+        raise LoxRuntimeError(name[2:], f"Undefined variable '{name[2:]}'.")
+    return value
+
+
+def _takes(arity):
+    # Decorates every generated function with the number of arguments Lox calls it with, not counting `this`.
+    def decorate(function):
+        function._arity = arity
+        return function
+    return decorate
+
+
+def _put(cell, value):
+    cell[0] = value
+    return value
+
+
+def _report(ex):
+    # Prints a runtime error the way the interpreter does, with the Lox line of the innermost generated statement.
+    if isinstance(ex, LoxRuntimeError):
+        name, message = ex.name, ex.message
+    elif isinstance(ex, NameError) and ex.name.startswith('g_'):
+        name = ex.name[2:]
+        message = f"Undefined variable '{name}'."
+    elif isinstance(ex, AttributeError) and ex.name and ex.name.startswith('p_'):
+        name = ex.name[2:]
+        if isinstance(ex.obj, super):
+            message = f"Undefined property '{name}'."
+        elif isinstance(ex.obj, LoxInstance):
+            message = f"Undefined property '{name}'"
+        else:
+            message = 'Only instances may have properties.'
+    else:
+        return False
+    line = 0
+    traceback = ex.__traceback__
+    while traceback:
+        index = traceback.tb_lineno - _FIRST_LINE
+        if traceback.tb_frame.f_globals is globals() and 0 <= index < len(_LINES):
+            line = _LINES[index]
+        traceback = traceback.tb_next
+    print(f'[line {line} at "{name}"] Error: {message}', file=sys.stderr)
+    return True
+
+
+@_takes(0)
+def g_clock():
+    return time.time()
+
+'''
+
+# Every Lox call goes through the helper for its number of arguments, which checks what is called and how many
+# arguments it gets the way Lox does, before Python would. Bound methods pass `_arity` on from their function. The
+# module gets one helper for each number of arguments its calls use, so none has to pack them into a tuple.
+CALL_HELPER = '''
+def _call{count}(callee{parameters}):
+    try:
+        arity = callee._arity
+    except AttributeError:
+        raise Exception('Can only call functions and classes.') from None
+    if arity != {count}:
+        raise Exception(f'Expected {{arity}} arguments but got {count}.')
+    return callee({arguments})
+
+'''
+
+EPILOGUE = [
+    'except Exception as ex:',
+    '    if not _report(ex):',
+    '        raise',
+]
+
+PYTHON_OPERATORS = {
+    TokenType.MINUS: '-',
+    TokenType.PLUS: '+',
+    TokenType.SLASH: '/',
+    TokenType.STAR: '*',
+    TokenType.GREATER: '>',
+    TokenType.GREATER_EQUAL: '>=',
+    TokenType.LESS: '<',
+    TokenType.LESS_EQUAL: '<=',
+    TokenType.EQUAL_EQUAL: '==',
+    TokenType.BANG_EQUAL: '!=',
+}
+
+
+class Local:
+    # A Lox local and the Python variable holding it. Python gives a function one variable per name, where Lox gives a
+    # block in a loop fresh ones each time round, so a local declared in a loop and captured by a closure is kept in a
+    # one-element list, which each closure gets as a keyword-only default when it is created.
+    __slots__ = ('name', 'level', 'inLoop', 'captured')
+
+    def __init__(self, name):
+        self.name = name
+        self.level = 0
+        self.inLoop = False
+        self.captured = False
+
+    @property
+    def isCell(self):
+        return self.captured and self.inLoop
+
+
+class Context:
+    # The Python function being written, or the module at level 0.
+    def __init__(self, captures, isInitializer=False):
+        self.captures = captures
+        self.isInitializer = isInitializer
+        self.loopDepth = 0
+        self.globals = set()
+        self.nonlocals = set()
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    # Writes resolved statements out as the source of a Python module, using Python's own locals, functions and
+    # classes. How a local must be stored depends on closures that may come after it, so the program is walked twice:
+    # the first walk only records what the second one needs.
+    def __init__(self):
+        self.locals = {}
+        self.captures = {}
+        self.fieldNames = set()
+        self.callCounts = set()
+        self.count = 0
+        self.lines = []
+        self.indent = 1
+        self.line = 1
+        self.scopes = []
+        self.contexts = []
+
+    def transpile(self, statements):
+        for _ in range(2):
+            self.lines = []
+            self.indent = 1
+            self.scopes = []
+            self.contexts = [Context(set())]
+            self.emitStatements(statements)
+
+        helpers = []
+        for count in sorted(self.callCounts):
+            arguments = ', '.join(f'a{index}' for index in range(count))
+            parameters = f', {arguments}' if count else ''
+            helpers.append(CALL_HELPER.format(count=count, parameters=parameters, arguments=arguments))
+        header = (RUNTIME + ''.join(helpers)).splitlines()
+        firstLine = len(header) + 3
+        lines = tuple(line for indent, text, line in self.lines)
+        program = [f'{"    " * indent}{text}' for indent, text, line in self.lines] or ['    pass']
+        return '\n'.join(header + [f'_FIRST_LINE, _LINES = {firstLine}, {lines!r}', 'try:'] + program + EPILOGUE) + '\n'
+
+    def emit(self, text):
+        self.lines.append((self.indent, text, self.line))
+
+    def emitStatements(self, statements):
+        for statement in statements:
+            if isinstance(statement, Expr):
+                # For loops put their increment straight into the body's statement list.
+                self.emitExpression(statement)
+            else:
+                statement.accept(self)
+
+    def emitSuite(self, statement):
+        self.indent += 1
+        start = len(self.lines)
+        self.emitStatements([statement])
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+
+    def emitExpression(self, expr: Expr):
+        # Assignments get the statement forms, which are cheaper than the expression ones.
+        if isinstance(expr, Assign):
+            self.emit(self.store(expr.name, self.evaluate(expr.value), True))
+        elif isinstance(expr, Set):
+            self.emit(self.setField(expr, True))
+        else:
+            self.emit(self.evaluate(expr))
+
+    def evaluate(self, expr: Expr):
+        return expr.accept(self)
+
+    @property
+    def level(self):
+        return len(self.contexts) - 1
+
+    def declare(self, name, key):
+        # Returns the Python name a declaration binds.
+        if not self.scopes:
+            return f'g_{name.lexeme}'
+        local = self.locals.get(key)
+        if local is None:
+            self.count += 1
+            local = self.locals[key] = Local(f'l_{name.lexeme}_{self.count}')
+        local.level = self.level
+        local.inLoop = self.contexts[-1].loopDepth > 0
+        self.scopes[-1][name.lexeme] = local
+        return local.name
+
+    def local(self, name):
+        for scope in reversed(self.scopes):
+            if name.lexeme in scope:
+                local = scope[name.lexeme]
+                if local.level < self.level:
+                    local.captured = True
+                    self.contexts[local.level + 1].captures.add(local)
+                return local
+        return None
+
+    def isCell(self, name):
+        return bool(self.scopes) and self.local(name).isCell
+
+    def load(self, name):
+        self.line = name.line
+        local = self.local(name)
+        if local is None:
+            return f'g_{name.lexeme}'
+        return f'{local.name}[0]' if local.isCell else local.name
+
+    def store(self, name, value, statement):
+        self.line = name.line
+        local = self.local(name)
+        context = self.contexts[-1]
+        if local is None:
+            target = f'g_{name.lexeme}'
+            value = f'_assign({target!r}, {value})'
+            if self.level:
+                context.globals.add(target)
+        elif local.isCell:
+            return f'{local.name}[0] = {value}' if statement else f'_put({local.name}, {value})'
+        else:
+            target = local.name
+            if local.level < self.level:
+                (context.nonlocals if local.level else context.globals).add(target)
+        return f'{target} = {value}' if statement else f'({target} := {value})'
+
+    def setField(self, expr: Set, statement):
+        obj = self.evaluate(expr.object)
+        value = self.evaluate(expr.value)
+        self.line = expr.name.line
+        attribute = f'p_{expr.name.lexeme}'
+        self.fieldNames.add(attribute)
+        if statement and isinstance(expr.object, This):
+            return f'this.{attribute} = {value}'
+        instance = f'_instance({obj}, {expr.name.lexeme!r})'
+        if statement:
+            return f'setattr({instance}, {attribute!r}, {value})'
+        return f'_set({instance}, {attribute!r}, {value})'
+
+    def function(self, stmt: Function, name, isMethod=False):
+        isInitializer = isMethod and stmt.name.lexeme == INIT_METHOD_NAME
+        context = Context(self.captures.setdefault(id(stmt), set()), isInitializer)
+        self.contexts.append(context)
+        self.scopes.append({})
+        params = ['this'] if isMethod else []
+        params += [self.declare(param, (id(stmt), index)) for index, param in enumerate(stmt.params)]
+        cells = sorted(local.name for local in context.captures if local.isCell)
+        if cells:
+            params += ['*'] + [f'{cell}={cell}' for cell in cells]
+        self.line = stmt.name.line
+        self.emit(f'@_takes({len(stmt.params)})')
+        self.emit(f'def {name}({", ".join(params)}):')
+
+        self.indent += 1
+        start = len(self.lines)
+        self.emitStatements(stmt.body)
+        if isInitializer:
+            self.emit('return this')
+        elif len(self.lines) == start:
+            self.emit('pass')
+        for keyword, names in [('nonlocal', context.nonlocals), ('global', context.globals)]:
+            if names:
+                self.lines.insert(start, (self.indent, f'{keyword} {", ".join(sorted(names))}', self.line))
+        self.indent -= 1
+
+        self.scopes.pop()
+        self.contexts.pop()
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        return self.store(expr.name, self.evaluate(expr.value), False)
+
+    def visitBinaryExpr(self, expr: Binary):
+        return f'({self.evaluate(expr.left)} {PYTHON_OPERATORS[expr.operator]} {self.evaluate(expr.right)})'
+
+    def visitCallExpr(self, expr: Call):
+        callee = self.evaluate(expr.callee)
+        arguments = ', '.join(self.evaluate(argument) for argument in expr.arguments)
+        self.line = expr.paren.line
+        count = len(expr.arguments)
+        self.callCounts.add(count)
+        return f'_call{count}({callee}, {arguments})' if count else f'_call0({callee})'
+
+    def visitGetExpr(self, expr: Get):
+        obj = self.evaluate(expr.object)
+        self.line = expr.name.line
+        return f'{obj}.p_{expr.name.lexeme}'
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.evaluate(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        return repr(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical):
+        operator = 'or' if expr.operator == TokenType.OR else 'and'
+        return f'({self.evaluate(expr.left)} {operator} {self.evaluate(expr.right)})'
+
+    def visitSetExpr(self, expr: Set):
+        return self.setField(expr, False)
+
+    def visitSuperExpr(self, expr: Super):
+        self.line = expr.method.line
+        return f'super(__class__, this).p_{expr.method.lexeme}'
+
+    def visitThisExpr(self, expr: This):
+        return 'this'
+
+    def visitUnaryExpr(self, expr: Unary):
+        if expr.operator == TokenType.BANG:
+            return f'(not {self.evaluate(expr.right)})'
+        if isinstance(expr.right, Literal) and type(expr.right.value) is float:
+            return repr(-expr.right.value)
+        return f'(-float({self.evaluate(expr.right)}))'
+
+    def visitVariableExpr(self, expr: Variable):
+        return self.load(expr.name)
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        self.scopes.append({})
+        self.emitStatements(stmt.statements)
+        self.scopes.pop()
+
+    def visitClassStmt(self, stmt: Class):
+        name = self.declare(stmt.name, id(stmt))
+        isCell = self.isCell(stmt.name)
+        base = 'LoxInstance'
+        if stmt.superclass:
+            base = f'_superclass({self.evaluate(stmt.superclass)}, {stmt.superclass.name.lexeme!r})'
+        self.line = stmt.name.line
+        if isCell:
+            self.emit(f'{name} = [None]')
+        self.emit(f'class {"_" + name if isCell else name}({base}, loxName={stmt.name.lexeme!r}):')
+
+        self.indent += 1
+        for method in stmt.methods:
+            attribute = f'p_{method.name.lexeme}'
+            if attribute in self.fieldNames:
+                self.emit('@LoxMethod')
+            self.function(method, attribute, True)
+        if not stmt.methods:
+            self.emit('pass')
+        self.indent -= 1
+
+        if isCell:
+            self.emit(f'{name}[0] = _{name}')
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.emitExpression(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Function):
+        name = self.declare(stmt.name, id(stmt))
+        if self.isCell(stmt.name):
+            self.emit(f'{name} = [None]')
+            self.function(stmt, f'_{name}')
+            self.emit(f'{name}[0] = _{name}')
+        else:
+            self.function(stmt, name)
+
+    def visitIfStmt(self, stmt: If):
+        self.emit(f'if {self.evaluate(stmt.condition)}:')
+        self.emitSuite(stmt.thenBranch)
+        if stmt.elseBranch:
+            self.emit('else:')
+            self.emitSuite(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.emit(f'print({self.evaluate(stmt.expression)})')
+
+    def visitReturnStmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if self.contexts[-1].isInitializer:
+            self.emit('return this')
+        elif stmt.value:
+            self.emit(f'return {self.evaluate(stmt.value)}')
+        else:
+            self.emit('return None')
+
+    def visitVarStmt(self, stmt: Var):
+        value = self.evaluate(stmt.initializer) if stmt.initializer else 'None'
+        self.line = stmt.name.line
+        name = self.declare(stmt.name, id(stmt))
+        self.emit(f'{name} = [{value}]' if self.isCell(stmt.name) else f'{name} = {value}')
+
+    def visitWhileStmt(self, stmt: While):
+        condition = 'True' if stmt.condition is None else self.evaluate(stmt.condition)
+        self.emit(f'while {condition}:')
+        self.contexts[-1].loopDepth += 1
+        self.emitSuite(stmt.body)
+        self.contexts[-1].loopDepth -= 1
@@ -0,0 +1,223 @@
+from expressions import (
+    Binary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Get, Set, This, Super, NumberBinary, StringConcat,
+)
+from exprvisitor import ExprVisitor
+from operators import BINARY_OPERATORS
+from statements import Print, Expression, Var, Block, If, While, Function, Return, Class
+from stmtvisitor import StmtVisitor
+from tokens import TokenType
+
+NUMBER = 'number'
+STRING = 'string'
+UNKNOWN = 'unknown'
+
+# What a NumberBinary computes for each operator it may carry. They are the functions a generic Binary looks up, so a
+# specialized node whose operands turn out not to be numbers still computes what the Binary would have, and needs no
+# check of its operands.
+NUMBER_OPERATORS = {
+    operator: BINARY_OPERATORS[operator] for operator in [
+        TokenType.MINUS, TokenType.PLUS, TokenType.SLASH, TokenType.STAR,
+        TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL,
+    ]
+}
+
+ARITHMETIC_OPERATORS = {TokenType.MINUS, TokenType.PLUS, TokenType.SLASH, TokenType.STAR}
+
+
+def join(a, b):
+    # None means nothing is known yet; it is the starting point of every local.
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    return UNKNOWN
+
+
+def literalType(value):
+    if type(value) is float:
+        return NUMBER
+    if type(value) is str:
+        return STRING
+    return UNKNOWN
+
+
+class TypeInference(ExprVisitor, StmtVisitor):
+    # Finds the locals that only ever hold numbers or only ever hold strings, and rewrites the Binary nodes working on
+    # them into NumberBinary or StringConcat. A local's type is the join of everything assigned to it anywhere,
+    # including from closures, found by walking the program until nothing changes. Parameters get no type from their
+    # callers; one that is used in arithmetic or a comparison with a number is assumed to be a number. A wrong guess
+    # costs nothing, as a specialized node runs its operator the way a Binary does, only without looking it up.
+    specialized = 0
+
+    def __init__(self):
+        self.frames = []
+        self.types = {}
+        self.previous = {}
+        self.params = set()
+        self.speculated = set()
+        self.rewrite = False
+
+    def inferProgram(self, statements):
+        while True:
+            speculated = len(self.speculated)
+            self.previous, self.types = self.types, {}
+            self.inferStatements(statements)
+            if self.types == self.previous and len(self.speculated) == speculated:
+                break
+        self.rewrite = True
+        self.inferStatements(statements)
+        return statements
+
+    def inferStatements(self, statements):
+        for statement in statements:
+            self.infer(statement)
+
+    def infer(self, node):
+        return node.accept(self)
+
+    def local(self, depth, slot):
+        # Identifies a local by the node that creates its frame and its slot there; globals give None.
+        return None if depth is None else (self.frames[-1 - depth], slot)
+
+    def declared(self, slot):
+        return None if slot is None else (self.frames[-1], slot)
+
+    def typeOf(self, key):
+        if key is None:
+            return UNKNOWN
+        if key in self.params:
+            return NUMBER if key in self.speculated else UNKNOWN
+        return self.previous.get(key)
+
+    def assign(self, key, valueType):
+        if key is not None and key not in self.params:
+            self.types[key] = join(self.types.get(key), valueType)
+
+    def speculate(self, expr, otherType):
+        if otherType == NUMBER and isinstance(expr, Variable):
+            key = self.local(expr.depth, expr.slot)
+            if key in self.params:
+                self.speculated.add(key)
+
+    def inferFunction(self, function: Function, isMethod=False):
+        # A method's `this` takes slot 0, ahead of the parameters, and is as unknown as they are.
+        self.frames.append(id(function))
+        for slot in range(len(function.params) + isMethod):
+            self.params.add((id(function), slot))
+        self.inferStatements(function.body)
+        self.frames.pop()
+
+    @staticmethod
+    def stats():
+        return {'specialized': TypeInference.specialized}
+
+    # Implement ExprVisitor
+    def visitAssignExpr(self, expr: Assign):
+        valueType = self.infer(expr.value)
+        self.assign(self.local(expr.depth, expr.slot), valueType)
+        return valueType
+
+    def visitBinaryExpr(self, expr: Binary):
+        left = self.infer(expr.left)
+        right = self.infer(expr.right)
+        if expr.operator not in NUMBER_OPERATORS:
+            return UNKNOWN
+        self.speculate(expr.left, right)
+        self.speculate(expr.right, left)
+
+        if left == right == NUMBER:
+            if self.rewrite and type(expr) is Binary:
+                expr.__class__ = NumberBinary
+                expr.function = NUMBER_OPERATORS[expr.operator]
+                TypeInference.specialized += 1
+            return NUMBER if expr.operator in ARITHMETIC_OPERATORS else UNKNOWN
+        if left == right == STRING and expr.operator == TokenType.PLUS:
+            if self.rewrite and type(expr) is Binary:
+                expr.__class__ = StringConcat
+                TypeInference.specialized += 1
+            return STRING
+        return None if None in (left, right) else UNKNOWN
+
+    def visitCallExpr(self, expr: Call):
+        self.infer(expr.callee)
+        for argument in expr.arguments:
+            self.infer(argument)
+        return UNKNOWN
+
+    def visitGetExpr(self, expr: Get):
+        self.infer(expr.object)
+        return UNKNOWN
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.infer(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        return literalType(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical):
+        return join(self.infer(expr.left), self.infer(expr.right))
+
+    def visitSetExpr(self, expr: Set):
+        self.infer(expr.object)
+        return self.infer(expr.value)
+
+    def visitSuperExpr(self, expr: Super):
+        return UNKNOWN
+
+    def visitThisExpr(self, expr: This):
+        return UNKNOWN
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.infer(expr.right)
+        return NUMBER if expr.operator == TokenType.MINUS else UNKNOWN
+
+    def visitVariableExpr(self, expr: Variable):
+        return self.typeOf(self.local(expr.depth, expr.slot))
+
+    # Implement StmtVisitor
+    def visitBlockStmt(self, stmt: Block):
+        if stmt.size is None:
+            self.inferStatements(stmt.statements)
+            return
+        self.frames.append(id(stmt))
+        self.inferStatements(stmt.statements)
+        self.frames.pop()
+
+    def visitClassStmt(self, stmt: Class):
+        if stmt.superclass:
+            self.infer(stmt.superclass)
+            self.frames.append(id(stmt))
+        for method in stmt.methods:
+            self.inferFunction(method, True)
+        if stmt.superclass:
+            self.frames.pop()
+        self.assign(self.declared(stmt.slot), UNKNOWN)
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.infer(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.assign(self.declared(stmt.slot), UNKNOWN)
+        self.inferFunction(stmt)
+
+    def visitIfStmt(self, stmt: If):
+        self.infer(stmt.condition)
+        self.infer(stmt.thenBranch)
+        if stmt.elseBranch:
+            self.infer(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.infer(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value:
+            self.infer(stmt.value)
+
+    def visitVarStmt(self, stmt: Var):
+        valueType = self.infer(stmt.initializer) if stmt.initializer else UNKNOWN
+        self.assign(self.declared(stmt.slot), valueType)
+
+    def visitWhileStmt(self, stmt: While):
+        if stmt.condition is not None:
+            self.infer(stmt.condition)
+        self.infer(stmt.body)
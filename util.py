@@ -5,9 +5,11 @@ from tokens import TokenType, Token
 
 class Errors:
     hadError = False
+    muted = False
 
     def eprint(*args, **kwargs):
-        print(*args, file=sys.stderr, **kwargs)
+        if not Errors.muted:
+            print(*args, file=sys.stderr, **kwargs)
 
     @staticmethod
     def error(message, token: Token):
@@ -18,3 +20,24 @@ class Errors:
             Errors.eprint(f'[line {line} at {where}] Error: {message}')
         else:
             raise ValueError('Need at least one of `line` or `token`.')
+
+    @staticmethod
+    def errorAt(line, message):
+        Errors.hadError = True
+        Errors.eprint(f'[line {line}] Error: {message}')
+
+
+class Stats:
+    reporters = {}
+
+    @staticmethod
+    def register(name, reporter):
+        Stats.reporters[name] = reporter
+
+    @staticmethod
+    def report(names=None):
+        for name, reporter in Stats.reporters.items():
+            if names is not None and name not in names:
+                continue
+            counters = ', '.join(f'{key}: {value}' for key, value in reporter().items())
+            Errors.eprint(f'[{name}] {counters}')
@@ -0,0 +1,346 @@
+from bytecode import BytecodeCompiler, OpCode
+from classes import LoxClass, LoxInstance
+from environment import GlobalEnvironment, LoxRuntimeError, UNDEFINED
+from functions import Clock
+from tokens import Token, TokenType
+from util import Errors
+
+# The dispatch loop compares against plain ints; looking up IntEnum members there would cost an attribute access each.
+(
+    CONSTANT, NIL, TRUE, FALSE, POP, GET_LOCAL, SET_LOCAL, GET_GLOBAL, DEFINE_GLOBAL, SET_GLOBAL, GET_UPVALUE,
+    SET_UPVALUE, GET_PROPERTY, SET_PROPERTY, GET_SUPER, EQUAL, NOT_EQUAL, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, ADD,
+    SUBTRACT, MULTIPLY, DIVIDE, NOT, NEGATE, PRINT, JUMP, JUMP_IF_FALSE, LOOP, CALL, INVOKE, SUPER_INVOKE, CLOSURE,
+    CLOSE_UPVALUE, RETURN, CLASS, INHERIT, METHOD,
+) = (op.value for op in OpCode)
+
+
+class Upvalue:
+    # A variable captured by a closure. While the variable is still on the stack, `cells` is the stack itself; when it
+    # goes out of scope the value moves into a list of its own, so reading it is `cells[index]` either way.
+    __slots__ = ('cells', 'index')
+
+    def __init__(self, stack, index):
+        self.cells = stack
+        self.index = index
+
+    def close(self):
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class Closure:
+    __slots__ = ('function', 'upvalues')
+
+    def __init__(self, function, upvalues):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class BoundMethod:
+    __slots__ = ('receiver', 'method')
+
+    def __init__(self, receiver, method: Closure):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
+
+
+class CallFrame:
+    __slots__ = ('closure', 'ip', 'base')
+
+    def __init__(self, closure: Closure, base):
+        self.closure = closure
+        self.ip = 0
+        self.base = base
+
+
+class VM:
+    # Runs resolved statements by compiling them to bytecode first. Drop-in replacement for Interpreter in Lox.
+    def __init__(self):
+        self.globals = GlobalEnvironment()
+        self.globals.define('clock', Clock())
+        self.compiler = BytecodeCompiler(self.globals)
+        self.stack = []
+        self.frames = []
+        self.openUpvalues = {}
+
+    def interpret(self, statements):
+        script = Closure(self.compiler.compile(statements), [])
+        if Errors.hadError:
+            return None
+        self.stack = [script]
+        self.frames = [CallFrame(script, 0)]
+        self.openUpvalues = {}
+        try:
+            return self.run()
+        except LoxRuntimeError as ex:
+            Errors.error(ex.message, ex.token)
+            return None
+
+    def runtimeError(self, frame, ip, name, message):
+        line = frame.closure.function.chunk.lines[ip - 1]
+        return LoxRuntimeError(Token(TokenType.IDENTIFIER, name, None, line), message)
+
+    def globalName(self, index):
+        return next(name for name, nameIndex in self.globals.indices.items() if nameIndex == index)
+
+    def callClosure(self, closure: Closure, argCount):
+        if argCount != closure.function.arity:
+            raise Exception(f'Expected {closure.function.arity} arguments but got {argCount}.')
+        self.frames.append(CallFrame(closure, len(self.stack) - argCount - 1))
+
+    def callValue(self, callee, argCount):
+        stack = self.stack
+        if isinstance(callee, Closure):
+            return self.callClosure(callee, argCount)
+        if isinstance(callee, BoundMethod):
+            stack[-argCount - 1] = callee.receiver
+            return self.callClosure(callee.method, argCount)
+        if isinstance(callee, LoxClass):
+            stack[-argCount - 1] = LoxInstance(callee)
+            if callee.initializer:
+                return self.callClosure(callee.initializer, argCount)
+            if argCount:
+                raise Exception(f'Expected 0 arguments but got {argCount}.')
+            return
+        try:
+            arity = callee.arity()
+        except AttributeError:
+            raise Exception('Can only call functions and classes.')
+        if argCount != arity:
+            raise Exception(f'Expected {arity} arguments but got {argCount}.')
+        arguments = stack[len(stack) - argCount:]
+        del stack[len(stack) - argCount - 1:]
+        stack.append(callee.call(self, arguments))
+
+    def captureUpvalue(self, index):
+        upvalue = self.openUpvalues.get(index)
+        if upvalue is None:
+            upvalue = self.openUpvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def closeUpvalues(self, fromIndex):
+        for index in [index for index in self.openUpvalues if index >= fromIndex]:
+            self.openUpvalues.pop(index).close()
+
+    def run(self):
+        stack = self.stack
+        frames = self.frames
+        push = stack.append
+        pop = stack.pop
+        globalValues = self.globals.values
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = closure.function.chunk.code
+        constants = closure.function.chunk.constants
+        base = frame.base
+        ip = frame.ip
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                push(constants[code[ip] << 8 | code[ip + 1]])
+                ip += 2
+            elif op == GET_GLOBAL:
+                value = globalValues[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                if value is UNDEFINED:
+                    name = self.globalName(code[ip - 2] << 8 | code[ip - 1])
+                    raise self.runtimeError(frame, ip, name, f"Undefined variable '{name}'.")
+                push(value)
+            elif op == JUMP_IF_FALSE:
+                if not stack[-1]:
+                    ip += code[ip] << 8 | code[ip + 1]
+                ip += 2
+            elif op == POP:
+                pop()
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == LESS_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == LOOP:
+                ip -= code[ip] << 8 | code[ip + 1]
+                ip += 2
+            elif op == JUMP:
+                ip += (code[ip] << 8 | code[ip + 1]) + 2
+            elif op == CALL or op == INVOKE or op == SUPER_INVOKE:
+                if op == CALL:
+                    argCount = code[ip]
+                    ip += 1
+                    frame.ip = ip
+                    self.callValue(stack[-argCount - 1], argCount)
+                else:
+                    name = constants[code[ip] << 8 | code[ip + 1]]
+                    argCount = code[ip + 2]
+                    ip += 3
+                    frame.ip = ip
+                    if op == SUPER_INVOKE:
+                        method = pop().findMethod(name)
+                        if not method:
+                            raise self.runtimeError(frame, ip, name, f"Undefined property '{name}'.")
+                        self.callClosure(method, argCount)
+                    else:
+                        # Calling a method straight off an instance: no bound method, the receiver is already where
+                        # the method's `this` goes.
+                        receiver = stack[-argCount - 1]
+                        if not isinstance(receiver, LoxInstance):
+                            raise self.runtimeError(frame, ip, name, 'Only instances may have properties.')
+                        method = receiver.cls.findMethod(name)
+                        if method:
+                            self.callClosure(method, argCount)
+                        elif (index := receiver.shape.indices.get(name)) is not None:
+                            stack[-argCount - 1] = receiver.values[index]
+                            self.callValue(stack[-argCount - 1], argCount)
+                        else:
+                            raise self.runtimeError(frame, ip, name, f"Undefined property '{name}'")
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                base = frame.base
+                ip = frame.ip
+            elif op == RETURN:
+                result = pop()
+                if self.openUpvalues:
+                    self.closeUpvalues(base)
+                frames.pop()
+                if not frames:
+                    return result
+                del stack[base:]
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                base = frame.base
+                ip = frame.ip
+            elif op == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                push(upvalue.cells[upvalue.index])
+                ip += 1
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 1
+            elif op == GET_PROPERTY:
+                name = constants[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    raise self.runtimeError(frame, ip, name, 'Only instances may have properties.')
+                method = instance.cls.findMethod(name)
+                if method:
+                    stack[-1] = BoundMethod(instance, method)
+                elif (index := instance.shape.indices.get(name)) is not None:
+                    stack[-1] = instance.values[index]
+                else:
+                    raise self.runtimeError(frame, ip, name, f"Undefined property '{name}'")
+            elif op == SET_PROPERTY:
+                name = constants[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                value = pop()
+                instance = pop()
+                if not isinstance(instance, LoxInstance):
+                    raise self.runtimeError(frame, ip, name, 'Only instances have fields.')
+                instance.put(name, value)
+                push(value)
+            elif op == GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == GREATER_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif op == MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == DIVIDE:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == NEGATE:
+                stack[-1] = -float(stack[-1])
+            elif op == NIL:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            elif op == FALSE:
+                push(False)
+            elif op == PRINT:
+                print(pop())
+            elif op == SET_GLOBAL:
+                index = code[ip] << 8 | code[ip + 1]
+                ip += 2
+                if globalValues[index] is UNDEFINED:
+                    name = self.globalName(index)
+                    raise self.runtimeError(frame, ip, name, f"Undefined variable '{name}'.")
+                globalValues[index] = stack[-1]
+            elif op == DEFINE_GLOBAL:
+                globalValues[code[ip] << 8 | code[ip + 1]] = pop()
+                ip += 2
+            elif op == CLOSURE:
+                function = constants[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                upvalues = []
+                for _ in range(function.upvalueCount):
+                    isLocal, index = code[ip], code[ip + 1]
+                    ip += 2
+                    upvalues.append(self.captureUpvalue(base + index) if isLocal else closure.upvalues[index])
+                push(Closure(function, upvalues))
+            elif op == CLOSE_UPVALUE:
+                upvalue = self.openUpvalues.pop(len(stack) - 1, None)
+                if upvalue:
+                    upvalue.close()
+                pop()
+            elif op == GET_SUPER:
+                name = constants[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                superclass = pop()
+                method = superclass.findMethod(name)
+                if not method:
+                    raise self.runtimeError(frame, ip, name, f"Undefined property '{name}'.")
+                stack[-1] = BoundMethod(stack[-1], method)
+            elif op == CLASS:
+                push(LoxClass(constants[code[ip] << 8 | code[ip + 1]], None, {}))
+                ip += 2
+            elif op == INHERIT:
+                name = constants[code[ip] << 8 | code[ip + 1]]
+                ip += 2
+                superclass = stack[-2]
+                if not isinstance(superclass, LoxClass):
+                    raise self.runtimeError(frame, ip, name, 'Superclass must be a class.')
+                pop().inherit(superclass)
+            elif op == METHOD:
+                method = pop()
+                stack[-1].addMethod(constants[code[ip] << 8 | code[ip + 1]], method)
+                ip += 2
+            else:
+                raise RuntimeError(f'Unknown opcode {op} at {ip - 1}.')